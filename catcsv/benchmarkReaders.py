@@ -0,0 +1,136 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy
+import pandas as pd
+
+import catcsv
+
+read_chunks = getattr(catcsv, "__read_chunks")
+
+
+def __get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--size",
+        help="Approximate size in MB of the generated csv file. Default=%(default)s",
+        type=int,
+        default=1000,
+        )
+    parser.add_argument(
+        "-f", "--file",
+        help="Existing csv file to read instead of generating one. Only the csv engines are compared",
+        )
+    parser.add_argument(
+        "-cs", "--chunk_size",
+        help="Number of rows read at a time. Default=%(default)s",
+        type=int,
+        default=10000,
+        )
+
+    return parser.parse_args()
+
+
+def __generate_files(directory, size):
+    """Write the same random table as csv and, if pyarrow is available, as Parquet and Feather.
+
+    Returns:
+        dict[str, str]: File name of each format
+    """
+
+    file_names = {"csv": os.path.join(directory, "benchmark.csv")}
+    if catcsv.pyarrow_imported:
+        file_names["parquet"] = os.path.join(directory, "benchmark.parquet")
+        file_names["feather"] = os.path.join(directory, "benchmark.feather")
+
+    rng = numpy.random.default_rng(seed=1)
+    block_size = 10**6
+    parquet_writer = None
+    feather_writer = None
+    iblock = 0
+    while iblock == 0 or os.path.getsize(file_names["csv"]) < size * 10**6:
+        df = pd.DataFrame({
+            **{ "x%d" % i: rng.normal(size=block_size) for i in range(5) },
+            **{ "n%d" % i: rng.integers(0, 10**6, size=block_size) for i in range(3) },
+            "name": rng.choice(["electron", "muon", "tau", "photon"], size=block_size),
+            "flag": rng.choice(["yes", "no"], size=block_size),
+        })
+        df.to_csv(file_names["csv"], mode="w" if iblock == 0 else "a", header=iblock == 0, index=False)
+
+        if catcsv.pyarrow_imported:
+            table = catcsv.pyarrow.Table.from_pandas(df, preserve_index=False)
+            if parquet_writer is None:
+                parquet_writer = catcsv.pyarrow.parquet.ParquetWriter(file_names["parquet"], table.schema)
+                feather_writer = catcsv.pyarrow.ipc.new_file(file_names["feather"], table.schema)
+            parquet_writer.write_table(table)
+            feather_writer.write_table(table)
+
+        iblock += 1
+
+    if parquet_writer is not None:
+        parquet_writer.close()
+        feather_writer.close()
+
+    return file_names
+
+
+def __time_reading(file_name, engine, chunk_size):
+    """Return the number of rows and the time to read all chunks of a file."""
+
+    args = argparse.Namespace(
+        file=file_name,
+        engine=engine,
+        delimiter=",",
+        nrows=None,
+        no_columns=False,
+        show_columns=None,
+        drop_columns=None,
+        create_columns=None,
+        where=None,
+        sort=None,
+        chunk_size=chunk_size,
+    )
+
+    start = time.time()
+    n_rows = sum(len(df) for df in read_chunks(args))
+
+    return n_rows, time.time() - start
+
+
+def main():
+    """Compare the time to read a csv file with each catcsv engine, and the same table as Parquet and Feather.
+
+    Example:
+    $ PYTHONPATH=/path/to/utilities python /path/to/utilities/catcsv/benchmarkReaders.py -s 1000
+    """
+
+    args = __get_arguments()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.file:
+            file_names = {"csv": args.file}
+        else:
+            start = time.time()
+            file_names = __generate_files(directory, args.size)
+            print("Generated files in %.2f s" % (time.time() - start))
+
+        print("csv file size: %.0f MB" % (os.path.getsize(file_names["csv"]) / 10**6))
+
+        engines = ["c", "mmap"]
+        if catcsv.pyarrow_imported:
+            engines.append("pyarrow")
+
+        benchmarks = [ ("csv, engine %s" % engine, file_names["csv"], engine) for engine in engines ]
+        for input_format in ("parquet", "feather"):
+            if input_format in file_names:
+                benchmarks.append((input_format, file_names[input_format], "c"))
+
+        for name, file_name, engine in benchmarks:
+            n_rows, time_reading = __time_reading(file_name, engine, args.chunk_size)
+            print("%-22s %d rows in %6.2f s" % (name + ":", n_rows, time_reading))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,15 @@
 import argparse
+import csv
+import functools
+import gzip
+import heapq
+import itertools
+import os
+import pickle
+import re
+import signal
+import sys
+import tempfile
 
 try:
     import pandas as pd
@@ -6,6 +17,15 @@ try:
 except:
     pandas_imported = False
 
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+    pyarrow_imported = True
+except:
+    pyarrow_imported = False
+
 
 def print_row(row, max_len, n_cols):
 
@@ -21,18 +41,20 @@ def print_row(row, max_len, n_cols):
     return
 
 
-if __name__ == "__main__":
-    """
-    Print csv file content with alignement of the beginning of each column
-    to make it easily legible in terminal.
-    """
-
-    ## Parse arguments
+def __get_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-f", "--file",
         help="csv file to cat"
     )
+    parser.add_argument(
+        "-e", "--engine",
+        help="Engine used to read csv files: c for the pandas C parser, mmap for the pandas C parser "
+             "on a memory-mapped file, pyarrow for the multithreaded pyarrow parser. "
+             "Parquet (.parquet, .pq) and Feather (.feather, .arrow) files are always read with pyarrow. Default=%(default)s",
+        choices=["c", "mmap", "pyarrow"],
+        default="c",
+    )
     parser.add_argument(
         "-d", "--delimiter",
         help="csv file delimiter",
@@ -59,7 +81,13 @@ if __name__ == "__main__":
         "-cc", "--create_columns",
         help="Create columns on the fly. "
              "Syntax: column1_name:expression1,column2_name:expression2 "
-             "Use df.column_name to build the expressions.",
+             "Use df.column_name or column_name to build the expressions, which are evaluated with DataFrame.eval. "
+             "Created columns can be used in the next expressions.",
+    )
+    parser.add_argument(
+        "-w", "--where",
+        help="Only show rows passing a selection evaluated with DataFrame.eval, after creating columns, "
+             "e.g. --where \"a > 0 and df.b < c\"",
     )
     parser.add_argument(
         "-s", "--sort",
@@ -77,76 +105,645 @@ if __name__ == "__main__":
         help="print index column",
         action="store_true"
     )
+    parser.add_argument(
+        "-cs", "--chunk_size",
+        help="Number of rows read at a time. Column widths are computed on the first chunk. Default=%(default)s",
+        type=int,
+        default=10000,
+    )
+    parser.add_argument(
+        "-sb", "--sort_buffer",
+        help="with --sort: maximum number of rows sorted in memory, "
+             "larger files are sorted by merging sorted runs written to temporary files. Default=%(default)s",
+        type=int,
+        default=1000000,
+    )
 
-    args = parser.parse_args()
+    return parser.parse_args()
 
 
-    if pandas_imported:
-        ## Read csv file
-        df = pd.read_csv(args.file, delimiter=args.delimiter)
+def __translate_expression(expression):
+    """Return an expression with df.column_name and df["column_name"] replaced by DataFrame.eval column names."""
 
-        if args.drop_columns:
-            df.drop(args.drop_columns.split(","), axis=1, inplace=True)
+    expression = re.sub(r"""\bdf\[\s*(["'])(.*?)\1\s*\]""", r"`\2`", expression)
+    expression = re.sub(r"\bdf\.([A-Za-z_]\w*)", r"`\1`", expression)
 
-        if args.show_columns:
-            columns_to_drop = [x for x in df.columns if x not in args.show_columns.split(",")]
-            df.drop(columns_to_drop, axis=1, inplace=True)
+    return expression
 
-        if args.create_columns:
-            for column_name_expression in args.create_columns.split(","):
-                column_name, expression = column_name_expression.split(":")
-                df[column_name] = eval(expression)
 
-        ## Sort dataframe if asked
-        if args.sort:
-            ascending = True if args.order=="+" else False
-            df.sort_values(args.sort.split(","), inplace=True, ascending=ascending)
+@functools.lru_cache(maxsize=None)
+def __get_created_columns(create_columns):
+    """Return the (column name, expression) pairs of --create_columns.
+
+    Expressions can contain commas, columns are only split before column_name:.
+    """
+
+    if not create_columns:
+        return []
+
+    created_columns = []
+    for column_name_expression in re.split(r",(?=\s*[A-Za-z_]\w*\s*:)", create_columns):
+        column_name, _, expression = column_name_expression.partition(":")
+        column_name = column_name.strip()
+        if not column_name.isidentifier() or expression.strip() == "":
+            print("ERROR: Invalid column creation %s, expected column_name:expression" % column_name_expression)
+            sys.exit(1)
+        created_columns.append((column_name, __translate_expression(expression.strip())))
+
+    return created_columns
+
+
+@functools.lru_cache(maxsize=None)
+def __get_program(create_columns, where):
+    """Return the assignments creating the columns, and the selection, as DataFrame.eval expressions.
+
+    They are built once for all chunks. Columns are created in one
+    DataFrame.eval call, so that each expression can use the previous columns.
+    """
+
+    assignments = "\n".join("%s = %s" % x for x in __get_created_columns(create_columns))
+    selection = __translate_expression(where) if where else None
+
+    return assignments, selection
+
+
+def __get_expression_columns(args):
+    """Return the names which may be columns used in --create_columns, --where and --sort."""
+
+    assignments, selection = __get_program(args.create_columns, args.where)
+
+    names = set()
+    for expression in (assignments, selection or ""):
+        names.update(re.findall(r"`([^`]*)`", expression))
+        names.update(re.findall(r"[A-Za-z_]\w*", re.sub(r"`[^`]*`", "", expression)))
+    if args.sort:
+        names.update(args.sort.split(","))
+
+    return names
+
+
+def __is_column_shown(args, column):
+    """Return whether a column of the input file is shown with --show_columns and --drop_columns."""
+
+    column = str(column)
+    if args.drop_columns and column in args.drop_columns.split(","):
+        return False
+    return not args.show_columns or column in args.show_columns.split(",")
+
+
+def __get_columns_to_read(args):
+    """Return a function selecting the columns to read, None to read all.
+
+    Columns shown and columns used to create columns, select or sort rows are
+    read. The selection is given to the reader, so that other columns are
+    never parsed.
+    """
+
+    if not args.show_columns and not args.drop_columns:
+        return None
+
+    expression_columns = __get_expression_columns(args)
+
+    def read_column(column):
+        return str(column) in expression_columns or __is_column_shown(args, column)
+
+    return read_column
+
+
+def __get_columns_to_print(args, columns):
+    """Return the columns shown with --show_columns and --drop_columns, and the created columns."""
+
+    created_columns = [ x[0] for x in __get_created_columns(args.create_columns) ]
+
+    return [ x for x in columns if x in created_columns or __is_column_shown(args, x) ]
 
-        ## Make columns
-        csv_data = [ list(df.columns) ]
-        csv_data = csv_data + [ [str(row[col]) for col in df.columns] for idx, row in df.iterrows() ]
 
+def __transform_chunk(args, df):
+    """Create columns of a chunk of the csv file, and keep the rows passing --where.
+
+    Expressions are evaluated with DataFrame.eval, using numexpr if installed.
+    """
+
+    assignments, selection = __get_program(args.create_columns, args.where)
+
+    try:
+        if assignments:
+            df = df.eval(assignments)
+        if selection:
+            df = df[df.eval(selection).astype(bool)]
+    except (SyntaxError, NameError, ValueError, TypeError, KeyError) as error:
+        print("ERROR: Could not evaluate expression: %s" % error)
+        sys.exit(1)
+
+    return df
+
+
+def __get_input_format(file_name):
+    """Return the format of a file from its extension: csv, parquet or feather.
+
+    Compressed csv files, e.g. .csv.gz or .csv.zst, are decompressed by the
+    csv readers.
+    """
+
+    file_name = file_name.lower()
+    if file_name.endswith((".parquet", ".pq")):
+        return "parquet"
+    elif file_name.endswith((".feather", ".arrow")):
+        return "feather"
     else:
-        if args.sort:
-            print("Could not import pandas, will not sort csv data")
-        if args.create_columns:
-            print("Could not import pandas, will not create columns")
-        if args.drop_columns:
-            print("Could not import pandas, will not drop columns")
+        return "csv"
 
-        ## Read csv file
-        with open (args.file, "r") as csv_file:
-            csv_data = csv_file.readlines()
-        csv_data = [ x.replace("\n", "").split(args.delimiter) for x in csv_data ]
 
-    ## Add index
-    if args.print_index:
-        header = [ ["Index"] + csv_data[0] ]
-        csv_data = [ [str(irow)] + row for irow, row in enumerate(csv_data[1:]) ]
-        csv_data =  header + csv_data
+def __read_csv_with_pandas(args, read_column):
+    """Yield the chunks of a csv file read with the pandas C parser, memory-mapped with --engine mmap."""
+
+    header = None if args.no_columns else "infer"
+    # Without header, pandas reads no row with a callable usecols: give the column positions
+    if header is None and read_column is not None:
+        first_row = pd.read_csv(args.file, delimiter=args.delimiter, header=None, nrows=1)
+        read_column = [ x for x in first_row.columns if read_column(x) ]
+    options = dict(
+        delimiter=args.delimiter,
+        header=header,
+        usecols=read_column,
+        memory_map=args.engine == "mmap",
+    )
+
+    try:
+        reader = pd.read_csv(args.file, chunksize=args.chunk_size, **options)
+    except ImportError as error:
+        # e.g. zstandard is needed for .zst files
+        print("ERROR: %s" % error)
+        print("Use --engine pyarrow to decompress the file with pyarrow.")
+        sys.exit(1)
+
+    n_chunks = 0
+    for df in reader:
+        n_chunks += 1
+        yield df
+
+    # Still give the columns of a file without rows
+    if n_chunks == 0:
+        yield pd.read_csv(args.file, nrows=0, **options)
+
+
+def __iterate_record_batches(batches, schema, chunk_size, column_names=None):
+    """Yield Arrow record batches as DataFrames of at most chunk_size rows, at least one even if empty."""
+
+    n_chunks = 0
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_size):
+            df = batch.slice(start, chunk_size).to_pandas()
+            if column_names is not None:
+                df.columns = column_names
+            n_chunks += 1
+            yield df
+
+    if n_chunks == 0:
+        df = schema.empty_table().to_pandas()
+        if column_names is not None:
+            df.columns = column_names
+        yield df
+
+
+def __read_csv_with_pyarrow(args, read_column):
+    """Yield the chunks of a csv file parsed by pyarrow with multiple threads.
+
+    Column types are inferred on the first block of the file, about 16 MB.
+    """
+
+    read_options = pyarrow.csv.ReadOptions(
+        use_threads=True,
+        block_size=1<<24,
+        autogenerate_column_names=args.no_columns,
+    )
+    parse_options = pyarrow.csv.ParseOptions(delimiter=args.delimiter)
+
+    def open_csv(convert_options=None):
+        # Compression is detected from the file extension
+        input_stream = pyarrow.input_stream(args.file, compression="detect")
+        return pyarrow.csv.open_csv(input_stream, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+
+    ## Select columns, named by their position without column names as with pandas
+    # Empty fields are missing values, as with pandas
+    convert_options = pyarrow.csv.ConvertOptions(strings_can_be_null=True)
+    column_names = None
+    if read_column is not None or args.no_columns:
+        names = open_csv(convert_options).schema.names
+        keys = list(range(len(names))) if args.no_columns else names
+        selected = [ (name, key) for name, key in zip(names, keys) if read_column is None or read_column(key) ]
+        # No included column means all columns for pyarrow
+        if len(selected) == 0:
+            yield pd.DataFrame()
+            return
+        convert_options.include_columns = [ x[0] for x in selected ]
+        if args.no_columns:
+            column_names = [ x[1] for x in selected ]
+
+    reader = open_csv(convert_options)
+    try:
+        yield from __iterate_record_batches(reader, reader.schema, args.chunk_size, column_names)
+    except pyarrow.ArrowInvalid as error:
+        print("ERROR: %s" % error)
+        print("Column types are inferred on the beginning of the file, use --engine c to read it.")
+        sys.exit(1)
+
+
+def __read_parquet(args, read_column):
+    """Yield the chunks of a Parquet file, reading only the selected columns."""
+
+    parquet_file = pyarrow.parquet.ParquetFile(args.file, memory_map=args.engine == "mmap")
+    schema = parquet_file.schema_arrow
+    columns = [ x for x in schema.names if read_column is None or read_column(x) ]
+
+    yield from __iterate_record_batches(
+        parquet_file.iter_batches(batch_size=args.chunk_size, columns=columns),
+        pyarrow.schema([ schema.field(x) for x in columns ]),
+        args.chunk_size,
+    )
+
+
+def __read_feather(args, read_column):
+    """Yield the chunks of a Feather (Arrow IPC) file, memory-mapped so that only read columns are loaded."""
+
+    reader = pyarrow.ipc.open_file(pyarrow.memory_map(args.file, "r"))
+    columns = [ x for x in reader.schema.names if read_column is None or read_column(x) ]
+    batches = ( reader.get_batch(i).select(columns) for i in range(reader.num_record_batches) )
+
+    yield from __iterate_record_batches(
+        batches,
+        pyarrow.schema([ reader.schema.field(x) for x in columns ]),
+        args.chunk_size,
+    )
+
+
+def __read_chunks(args):
+    """Yield the input file as DataFrames of at most args.chunk_size rows.
+
+    Only the columns needed are parsed. Columns are created and rows selected
+    on each chunk. Without sorting, reading stops after --nrows rows.
+    """
+
+    input_format = __get_input_format(args.file)
+    if (input_format != "csv" or args.engine == "pyarrow") and not pyarrow_imported:
+        print("ERROR: Could not import pyarrow, needed to read %s" % ("%s files" % input_format if input_format != "csv" else "with --engine pyarrow"))
+        sys.exit(1)
+
+    if input_format == "parquet":
+        chunks = __read_parquet(args, __get_columns_to_read(args))
+    elif input_format == "feather":
+        chunks = __read_feather(args, __get_columns_to_read(args))
+    elif args.engine == "pyarrow":
+        chunks = __read_csv_with_pyarrow(args, __get_columns_to_read(args))
+    else:
+        chunks = __read_csv_with_pandas(args, __get_columns_to_read(args))
+
+    nrows = int(args.nrows) if args.nrows and not args.sort else None
+
+    n_read = 0
+    for df in chunks:
+        df = __transform_chunk(args, df)
+        if nrows is not None:
+            df = df.iloc[:nrows-n_read]
+        n_read += len(df)
+        yield df
+        if nrows is not None and n_read >= nrows:
+            return
+
+
+def __write_sorted_run(df, directory, block_size):
+    """Write a sorted DataFrame to a temporary file, as consecutive pickled blocks of rows."""
+
+    file_descriptor, file_name = tempfile.mkstemp(dir=directory, suffix=".pkl")
+    with os.fdopen(file_descriptor, "wb") as run_file:
+        for start in range(0, len(df), block_size):
+            pickle.dump(df.iloc[start:start+block_size], run_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return file_name
+
+
+def __iterate_sorted_run(file_name, sort_column_indices, ascending):
+    """Yield (sort key, row) for the rows of a sorted run, reading one block at a time."""
+
+    with open(file_name, "rb") as run_file:
+        while True:
+            try:
+                block = pickle.load(run_file)
+            except EOFError:
+                return
+            for row in block.itertuples(index=False, name=None):
+                # Missing values are last in both orders, as in DataFrame.sort_values
+                key = tuple(
+                    (pd.isna(row[i]) == ascending, 0 if pd.isna(row[i]) else row[i])
+                    for i in sort_column_indices
+                )
+                yield key, row
+
+
+def __sort_chunks(args, chunks):
+    """Yield the rows of all chunks sorted, as DataFrames.
+
+    Up to args.sort_buffer rows are sorted in memory. Larger files are split
+    into sorted runs of args.sort_buffer rows written to temporary files, which
+    are then merged, so that at most one block of rows per run is in memory.
+    """
+
+    sort_columns = args.sort.split(",")
+    ascending = args.order == "+"
+
+    with tempfile.TemporaryDirectory() as directory:
+        buffer = []
+        n_buffer_rows = 0
+        runs = []
+        columns = None
+        for df in chunks:
+            columns = df.columns
+            buffer.append(df)
+            n_buffer_rows += len(df)
+            if n_buffer_rows >= args.sort_buffer:
+                df = pd.concat(buffer).sort_values(sort_columns, ascending=ascending)
+                runs.append(__write_sorted_run(df, directory, args.chunk_size))
+                buffer = []
+                n_buffer_rows = 0
+
+        # Everything fits in memory
+        if len(runs) == 0:
+            yield pd.concat(buffer).sort_values(sort_columns, ascending=ascending)
+            return
+
+        if len(buffer) > 0:
+            df = pd.concat(buffer).sort_values(sort_columns, ascending=ascending)
+            runs.append(__write_sorted_run(df, directory, args.chunk_size))
+
+        sort_column_indices = [ list(columns).index(x) for x in sort_columns ]
+        merged_rows = heapq.merge(
+            *[ __iterate_sorted_run(run, sort_column_indices, ascending) for run in runs ],
+            key=lambda x: x[0],
+            reverse=not ascending,
+        )
+        while True:
+            rows = [ row for key, row in itertools.islice(merged_rows, args.chunk_size) ]
+            if len(rows) == 0:
+                return
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def __get_top_rows(args, chunks):
+    """Yield the first --nrows rows of all chunks sorted, as one DataFrame.
+
+    Only the best rows so far and the current chunk are kept in memory. A
+    stable sort is used so that rows with equal values keep the order of the
+    file.
+    """
+
+    sort_columns = args.sort.split(",")
+    ascending = args.order == "+"
+    nrows = int(args.nrows)
+
+    top_rows = None
+    for df in chunks:
+        if top_rows is not None:
+            df = pd.concat([top_rows, df])
+        top_rows = df.sort_values(sort_columns, ascending=ascending, kind="stable").head(nrows)
+
+    yield top_rows
+
+
+def __read_rows_without_pandas(args):
+    """Yield the rows of the csv file split by the delimiter, args.chunk_size rows at a time.
+
+    Quoted fields are parsed with the csv module. Only plain and gzip compressed
+    csv files can be read without pandas.
+    """
+
+    if args.file.lower().endswith(".gz"):
+        csv_file = gzip.open(args.file, "rt", newline="")
+    elif args.file.lower().endswith((".zst", ".parquet", ".pq", ".feather", ".arrow")):
+        print("ERROR: Could not import pandas, needed to read %s" % args.file)
+        sys.exit(1)
+    else:
+        csv_file = open(args.file, "r", newline="")
+
+    with csv_file:
+        rows = csv.reader(csv_file, delimiter=args.delimiter)
+        while True:
+            chunk = list(itertools.islice(rows, args.chunk_size))
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+
+def __print_table(args, header, row_chunks):
+    """Print rows aligned in columns, as soon as they are read.
+
+    Column widths are computed on the header and the first chunk of rows, so
+    that printing starts before the whole file is read. Longer values in the
+    next chunks are printed in full.
+
+    Args:
+        args (argparse.Namespace)
+        header (list[str] or None): Column names, None to not print them
+        row_chunks (iterable[list[list[str]]]): Chunks of rows of str
+    """
+
+    nrows = int(args.nrows) if args.nrows else None
+    row_chunks = iter(row_chunks)
+
+    ## Sample window to compute the column widths
+    sample = next(row_chunks, [])
+    if nrows is not None:
+        sample = sample[:nrows]
 
     ## Get number of columns
-    n_cols = len(csv_data[0])
+    if header is not None:
+        n_cols = len(header)
+    elif len(sample) > 0:
+        n_cols = len(sample[0])
+    else:
+        return
 
     ## Compute max length of each column
-    max_len = n_cols * [0] 
-    for row in csv_data:
+    max_len = n_cols * [0]
+    for row in ([header] if header is not None else []) + sample:
         for ic in range(n_cols):
             if max_len[ic] < len(row[ic]):
                 max_len[ic] = len(row[ic])
 
+    ## Add index
+    if args.print_index:
+        n_cols += 1
+        max_len = [ max(len("Index"), len(str(max(len(sample)-1, 0)))) ] + max_len
+        if header is not None:
+            header = ["Index"] + header
+
     ## Print csv file
-    if not args.no_columns:
-        print_row(csv_data[0], max_len, n_cols)
+    if header is not None and not args.no_columns:
+        print_row(header, max_len, n_cols)
         print((sum(max_len)+2*len(max_len))*"-")
-        idx0 = 1
-    else: idx0 = 0
 
-    if not args.nrows:
-        csv_to_print = csv_data[idx0:]
-    else:
-        csv_to_print = csv_data[idx0:int(args.nrows)]
+    rows = itertools.chain(sample, itertools.chain.from_iterable(row_chunks))
+    if nrows is not None:
+        rows = itertools.islice(rows, nrows)
 
-    for row in csv_to_print:
+    for irow, row in enumerate(rows):
+        if args.print_index:
+            row = [str(irow)] + row
         print_row(row, max_len, n_cols)
 
+
+def __get_string_columns(df):
+    """Return the columns of a DataFrame converted to lists of str, with missing values as nan.
+
+    Float columns narrower than float64 are converted by numpy so that they keep their own precision.
+    """
+
+    columns = []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind == "f" and values.dtype.itemsize < 8:
+            columns.append(values.astype(str).tolist())
+        else:
+            columns.append([ str(x) for x in values.tolist() ])
+
+    return columns
+
+
+def __format_rows(string_columns, max_len, first_index=None):
+    """Format rows aligned in columns, column by column.
+
+    Args:
+        string_columns (list[list[str]]): Columns of str
+        max_len (list[int]): Width of each column, including the index column
+        first_index (int or None, optional, default=None): Index of the first
+            row to print an index column, None for no index column
+
+    Returns:
+        str: Lines of the rows, each terminated by a new line
+    """
+
+    if first_index is not None:
+        n_rows = len(string_columns[0]) if len(string_columns) > 0 else 0
+        string_columns = [ [ str(x) for x in range(first_index, first_index+n_rows) ] ] + string_columns
+
+    if len(string_columns) == 0 or len(string_columns[0]) == 0:
+        return ""
+
+    # Every column but the last one is padded to its width
+    padded_columns = [ [ x.ljust(width) for x in column ] for column, width in zip(string_columns[:-1], max_len) ]
+    padded_columns.append(string_columns[-1])
+
+    return "\n".join(map(" | ".join, zip(*padded_columns))) + "\n"
+
+
+def __print_data_frames(args, header, chunks):
+    """Print DataFrames aligned in columns, as soon as they are read.
+
+    Column widths are computed on the header and the first chunk of rows, so
+    that printing starts before the whole file is read. Longer values in the
+    next chunks are printed in full. Each chunk is formatted column by column
+    and written at once.
+
+    Args:
+        args (argparse.Namespace)
+        header (list[str] or None): Column names, None to not print them
+        chunks (iterable[pandas.DataFrame])
+    """
+
+    nrows = int(args.nrows) if args.nrows else None
+    chunks = iter(chunks)
+
+    ## Sample window to compute the column widths
+    sample = next(chunks)
+    if nrows is not None:
+        sample = sample.iloc[:nrows]
+    string_columns = __get_string_columns(sample)
+
+    ## Compute max length of each column
+    max_len = [ max(map(len, x), default=0) for x in string_columns ]
+    if header is not None:
+        max_len = [ max(x, len(name)) for x, name in zip(max_len, header) ]
+
+    ## Add index
+    if args.print_index:
+        max_len = [ max(len("Index"), len(str(max(len(sample)-1, 0)))) ] + max_len
+        if header is not None:
+            header = ["Index"] + header
+
+    ## Print csv file
+    if header is not None:
+        print_row(header, max_len, len(max_len))
+        print((sum(max_len)+2*len(max_len))*"-")
+
+    n_printed = 0
+    while True:
+        first_index = n_printed if args.print_index else None
+        sys.stdout.write(__format_rows(string_columns, max_len, first_index))
+        n_printed += len(sample)
+
+        sample = next(chunks, None)
+        if sample is None or (nrows is not None and n_printed >= nrows):
+            break
+        if nrows is not None:
+            sample = sample.iloc[:nrows-n_printed]
+        string_columns = __get_string_columns(sample)
+
+
+def main():
+    """
+    Print csv file content with alignement of the beginning of each column
+    to make it easily legible in terminal.
+
+    The file is read in chunks and printed as it is read, so that the first
+    rows of a large file are printed immediately.
+    """
+
+    args = __get_arguments()
+
+    if pandas_imported:
+        ## Read csv file
+        chunks = __read_chunks(args)
+
+        ## Sort dataframe if asked, only keeping the top rows with --nrows
+        if args.sort and args.nrows:
+            chunks = __get_top_rows(args, chunks)
+        elif args.sort:
+            chunks = __sort_chunks(args, chunks)
+
+        first_chunk = next(chunks)
+        columns = __get_columns_to_print(args, first_chunk.columns)
+        if len(columns) == 0:
+            print("ERROR: No column to show")
+            sys.exit(1)
+        header = None if args.no_columns else [ str(x) for x in columns ]
+
+        chunks = ( df[columns] for df in itertools.chain([first_chunk], chunks) )
+        __print_data_frames(args, header, chunks)
+        return
+
+    else:
+        if args.sort:
+            print("Could not import pandas, will not sort csv data")
+        if args.create_columns:
+            print("Could not import pandas, will not create columns")
+        if args.drop_columns:
+            print("Could not import pandas, will not drop columns")
+        if args.where:
+            print("Could not import pandas, will not select rows")
+
+        ## Read csv file
+        row_chunks = __read_rows_without_pandas(args)
+        if args.no_columns:
+            header = None
+        else:
+            first_rows = next(row_chunks, [])
+            header = first_rows[0] if len(first_rows) > 0 else None
+            row_chunks = itertools.chain([first_rows[1:]], row_chunks)
+
+    __print_table(args, header, row_chunks)
+
+
+if __name__ == "__main__":
+
+    # Exit quietly when the output is piped to a command which stops reading, e.g. head
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    main()
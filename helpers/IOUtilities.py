@@ -1,9 +1,21 @@
 import os
+import functools
+import json
+import sqlite3
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from helpers import generalUtilities as gUtl
 
 
+# Version of the format of the ROOT files metadata, older cached metadata is read again
+metadata_version = 3
+
+# Class names of directory keys: ROOT writes TDirectoryFile, uproot TDirectory
+directory_classnames = ("TDirectory", "TDirectoryFile")
+
+
 def has_redirector(file_name):
 
     if file_name.startswith("root://"):
@@ -33,20 +45,226 @@ def get_file_name_without_directory(file_name):
     return file_name.split("/")[-1]
 
 
+class StorageError(OSError):
+    """Error raised by a storage backend."""
+
+
+class AuthenticationError(StorageError):
+    """The storage refused the request for lack of valid credentials, e.g. an expired voms proxy."""
+
+
+class ServerError(StorageError):
+    """The storage server failed to handle the request."""
+
+
+class UnsupportedOperationError(StorageError):
+    """The storage server does not support the request, e.g. stat on old XRootD servers."""
+
+
+class LocalStorage:
+    """Storage backend for the local file system."""
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def stat(self, path):
+        """Return the size and modification time of a file.
+
+        Raises:
+            FileNotFoundError
+        """
+        stat = os.stat(path)
+        return stat.st_size, str(stat.st_mtime_ns)
+
+    def listdir(self, path):
+        """Return the names of the entries of a directory.
+
+        Raises:
+            FileNotFoundError
+        """
+        with os.scandir(path or ".") as entries:
+            return [ entry.name for entry in entries ]
+
+    def mkdir(self, path, exist_ok=False):
+        Path(path).mkdir(parents=True, exist_ok=exist_ok)
+
+
+class XRootDStorage:
+    """Storage backend for an XRootD server, using the XRootD Python bindings.
+
+    The connection to the server is opened once and reused for all requests.
+
+    Args:
+        redirector (str): e.g. root://t3dcachedb03.psi.ch:1094
+        file_system (optional, default=None): Object with the methods of
+            XRootD.client.FileSystem, e.g. helpers.xrootdStandIn.StandInFileSystem
+            to check the backend without server. By default, a client of the
+            redirector.
+
+    Raises:
+        ImportError: If file_system is None and the bindings are not installed
+    """
+
+    # XRootD client status codes and server error numbers
+    error_authentication_failed = 204
+    error_response = 400
+    server_errors_not_found = (3011,)
+    server_errors_authentication = (3010,)
+    server_errors_unsupported = (3013,)
+    # MkDirFlags.MAKEPATH
+    mkdir_flags = 1
+
+    def __init__(self, redirector, file_system=None):
+        if file_system is None:
+            from XRootD import client
+            file_system = client.FileSystem(redirector)
+
+        self.redirector = redirector
+        self.file_system = file_system
+
+    def __raise_for_status(self, status, path):
+
+        if status.ok:
+            return
+        message = "%s%s: %s" % (self.redirector, path, status.message.strip())
+        if status.code == self.error_authentication_failed or status.errno in self.server_errors_authentication:
+            raise AuthenticationError(message)
+        if status.code == self.error_response and status.errno in self.server_errors_not_found:
+            raise FileNotFoundError(message)
+        if status.code == self.error_response and status.errno in self.server_errors_unsupported:
+            raise UnsupportedOperationError(message)
+        raise ServerError(message)
+
+    def exists(self, path):
+        try:
+            self.stat(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stat(self, path):
+        status, stat_info = self.file_system.stat(path)
+        self.__raise_for_status(status, path)
+        return stat_info.size, str(stat_info.modtime)
+
+    def listdir(self, path):
+        status, listing = self.file_system.dirlist(path)
+        self.__raise_for_status(status, path)
+        return [ entry.name.rstrip("/").split("/")[-1] for entry in listing ]
+
+    def mkdir(self, path, exist_ok=False):
+        if exist_ok and self.exists(path):
+            return
+        status, _ = self.file_system.mkdir(path, self.mkdir_flags)
+        self.__raise_for_status(status, path)
+
+
+class XrdfsStorage:
+    """Storage backend for an XRootD server, using the xrdfs command when the Python bindings are not installed.
+
+    Args:
+        redirector (str)
+    """
+
+    def __init__(self, redirector):
+        self.redirector = redirector
+
+    def __run(self, *arguments):
+
+        result = subprocess.run(
+            ["xrdfs", self.redirector] + list(arguments),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        message = "%s %s: %s" % (self.redirector, " ".join(arguments), result.stderr.strip())
+        if result.returncode == 0:
+            return result.stdout
+        elif result.returncode == 2:
+            raise AuthenticationError(message)
+        # When running CMSSW, xrdfs returns code 50 with "[ERROR] Internal error"
+        elif result.returncode == 50:
+            raise ServerError(message)
+        # Old versions of xrootd cannot check file existence
+        elif result.returncode == 54:
+            raise UnsupportedOperationError(message)
+        else:
+            raise FileNotFoundError(message)
+
+    def exists(self, path):
+        try:
+            self.__run("ls", path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stat(self, path):
+        stat = {}
+        for line in self.__run("stat", path).split("\n"):
+            if ":" in line:
+                key, value = line.split(":", 1)
+                stat[key.strip()] = value.strip()
+        if "Size" not in stat or "MTime" not in stat:
+            raise UnsupportedOperationError("%s%s: no size or modification time" % (self.redirector, path))
+        return int(stat["Size"]), stat["MTime"]
+
+    def listdir(self, path):
+        return [
+            get_file_name_without_directory(line.strip().rstrip("/"))
+            for line in self.__run("ls", path).split("\n") if line.strip() != ""
+        ]
+
+    def mkdir(self, path, exist_ok=False):
+        if exist_ok and self.exists(path):
+            return
+        self.__run("mkdir", "-p", path)
+
+
+@functools.lru_cache(maxsize=None)
+def __get_storage(redirector):
+
+    if redirector is None:
+        return LocalStorage()
+    try:
+        return XRootDStorage(redirector)
+    except ImportError:
+        return XrdfsStorage(redirector)
+
+
+def get_storage(file_name):
+    """Return the storage backend of a file, shared by all files with the same redirector.
+
+    Args:
+        file_name (str)
+
+    Returns:
+        LocalStorage, XRootDStorage or XrdfsStorage: Backend taking logical
+            file names, with methods exists, stat, listdir and mkdir
+    """
+
+    return __get_storage(get_redirector(file_name))
+
+
+def __exit_for_authentication_error():
+
+    print("Refresh your voms proxy by running the following command:")
+    print("voms-proxy-init --rfc --voms cms -valid 192:00")
+    exit(1)
+
+
 def make_directory(directory_name, check_exists=False):
 
-    redirector = get_redirector(directory_name)
     logical_file_name = get_logical_file_name(directory_name)
 
     if check_exists:
-        if file_exists(file_exists(file_name)):
+        if file_exists(directory_name):
             return
 
     print("Making directory %s " % directory_name)
-    if redirector is None:
-        Path(directory_name).mkdir(parents=True, exist_ok=check_exists)
-    else:
-        os.system("xrdfs %s mkdir -p %s" % (redirector, logical_file_name))
+    try:
+        get_storage(directory_name).mkdir(logical_file_name, exist_ok=check_exists)
+    except AuthenticationError:
+        __exit_for_authentication_error()
 
 
 def file_exists(file_name):
@@ -72,42 +290,439 @@ def file_exists(file_name):
     redirector = get_redirector(file_name)
     logical_file_name = get_logical_file_name(file_name)
 
-    if redirector is None:
-        exit_code = gUtl.get_exit_code("ls %s > /dev/null 2>&1" % (logical_file_name))
-      
-    else:
-        # If global redirector do not check if the file exists
-        if redirector == "root://cms-xrd-global.cern.ch/":
-            return True
+    # If global redirector do not check if the file exists
+    if redirector == "root://cms-xrd-global.cern.ch/":
+        return True
+
+    storage = get_storage(file_name)
+    try:
+        return storage.exists(logical_file_name)
+
+    except AuthenticationError:
+        __exit_for_authentication_error()
+
+    # File existence cannot be checked on old versions of xrootd
+    # But files in a directory can be listed
+    except UnsupportedOperationError:
+        directory = os.path.dirname(logical_file_name)
+        try:
+            return get_file_name_without_directory(logical_file_name) in storage.listdir(directory)
+        except FileNotFoundError:
+            return False
+
+    # When running CMSSW, xrootd fails with an internal error
+    # Try to locate the file on T3 PSI storage element instead in that case
+    # if the redirector is the T3 PSI redirector
+    except ServerError:
+        if redirector not in t3_psi_redirectors:
+            return False
+        prefix = "" if redirector in t3_psi_redirectors_inside_t3 else path_to_t3_storage_element
+        return get_storage(None).exists("%s/%s" % (prefix, logical_file_name))
+
+
+@functools.lru_cache(maxsize=None)
+def list_directory(directory):
+    """Return the names of the files in a directory, cached for the run.
+
+    Args:
+        directory (str): Local directory or directory with a redirector
 
-        if redirector is None:
-            exit_code = gUtl.get_exit_code("ls %s > /dev/null 2>&1" % (logical_file_name))
-          
+    Returns:
+        frozenset[str] or None: File names without directory, None if the
+            directory cannot be listed
+    """
+
+    try:
+        return frozenset(get_storage(directory).listdir(get_logical_file_name(directory)))
+    except FileNotFoundError:
+        return frozenset()
+    except AuthenticationError:
+        __exit_for_authentication_error()
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def __file_exists_cached(file_name):
+
+    return file_exists(file_name)
+
+
+def files_exist(file_names, max_workers=16):
+    """Return whether each file exists, checking all files of a directory at once.
+
+    Each parent directory is listed only once. Files in directories which
+    cannot be listed are checked one by one with file_exists, with at most
+    max_workers checks at the same time. Results are cached for the run.
+
+    Args:
+        file_names (list[str])
+        max_workers (int, optional, default=16)
+
+    Returns:
+        list[bool]
+    """
+
+    exists = {}
+    files_to_check = []
+    for file_name in file_names:
+        if file_name in exists:
+            continue
+        if get_redirector(file_name) == "root://cms-xrd-global.cern.ch/":
+            exists[file_name] = True
+            continue
+        directory, name = file_name.rsplit("/", 1) if "/" in file_name else ("", file_name)
+        files_in_directory = list_directory(directory if directory != "" or "/" not in file_name else "/")
+        if files_in_directory is None:
+            files_to_check.append(file_name)
         else:
-            exit_code = gUtl.get_exit_code("xrdfs %s ls %s > /dev/null 2>&1" % (redirector, logical_file_name))
-            if exit_code == 2:
-                print("Refresh your voms proxy by running the following command:")
-                print("voms-proxy-init --rfc --voms cms -valid 192:00")
-                exit(1)
-        
-            # It looks like this is an old version of xrootd
-            # File existence cannot be checked via xrdfs ls
-            # But files in a directory can be listed
-            elif exit_code == 54:
-                directory = os.path.dirname(logical_file_name)
-                file_name_no_dir = get_file_name_without_directory(logical_file_name)
-                files_list = gUtl.run_bash_command("xrdfs %s ls %s" % (redirector, directory)).split("\n")
-                return logical_file_name in files_list
-
-            # When running CMSSW, xrdfs returns code 50 with the following error message:
-            # [ERROR] Internal error
-            # Try to locate the file on T3 PSI storage element instead in that case
-            # if the redirector is the T3 PSI redirector
-            elif exit_code == 50 and redirector in t3_psi_redirectors:
-                prefix = "" if redirector in t3_psi_redirectors_inside_t3 else path_to_t3_storage_element
-                exit_code = gUtl.get_exit_code("ls %s/%s > /dev/null 2>&1" % (prefix, logical_file_name))
-            
-    if exit_code == 0:
-        return True
+            exists[file_name] = name in files_in_directory
+
+    if len(files_to_check) > 0:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            exists.update(zip(files_to_check, executor.map(__file_exists_cached, files_to_check)))
+
+    return [ exists[file_name] for file_name in file_names ]
+
+
+def get_cache_directory():
+    """Return the directory where the utilities cache their data.
+
+    Returns:
+        str
+    """
+
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "utilities")
+
+
+def get_file_identity(file_name):
+    """Return the size and modification time of a file, or None if unknown.
+
+    Args:
+        file_name (str)
+
+    Returns:
+        tuple[int, str] or None
+    """
+
+    try:
+        return get_storage(file_name).stat(get_logical_file_name(file_name))
+    except OSError:
+        return None
+
+
+def __get_branches_metadata(branches):
+
+    metadata = []
+    for branch in branches:
+        try:
+            interpretation = repr(branch.interpretation)
+        except Exception:
+            interpretation = "unknown"
+        metadata.append({
+            "name": branch.name,
+            "classname": branch.classname,
+            "typename": branch.typename,
+            "interpretation": interpretation,
+            "compressed_bytes": branch.compressed_bytes,
+            "uncompressed_bytes": branch.uncompressed_bytes,
+            "num_baskets": branch.num_baskets,
+            "children": __get_branches_metadata(branch.branches),
+        })
+
+    return metadata
+
+
+def __get_directory_metadata(directory):
+
+    metadata = []
+    for name, classname in directory.classnames(recursive=False, cycle=False).items():
+        node = {"name": name, "classname": classname, "children": []}
+        if classname in directory_classnames:
+            node["children"] = __get_directory_metadata(directory[name])
+        elif classname == "TTree":
+            tree = directory[name]
+            node["num_entries"] = tree.num_entries
+            node["children"] = __get_branches_metadata(tree.branches)
+        metadata.append(node)
+
+    return metadata
+
+
+def read_root_file_metadata(file_name):
+    """Read the keys, TTrees and branches of a ROOT file, without reading any branch data.
+
+    Args:
+        file_name (str)
+
+    Returns:
+        dict: Tree of nodes with keys "name", "classname" and "children".
+            TTree nodes also have "num_entries", TBranch nodes also have
+            "typename", "interpretation", "compressed_bytes",
+            "uncompressed_bytes" and "num_baskets". The root node has the
+            "version" of the metadata format.
+    """
+
+    import uproot
+
+    with uproot.open(file_name) as file_:
+        return {
+            "name": "",
+            "classname": "TDirectory",
+            "version": metadata_version,
+            "children": __get_directory_metadata(file_),
+        }
+
+
+def __get_metadata_cache_key(file_name):
+
+    if has_redirector(file_name):
+        return file_name
     else:
-        return False
+        return os.path.realpath(file_name)
+
+
+def __connect_metadata_cache():
+
+    Path(get_cache_directory()).mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(get_cache_directory(), "root_metadata.sqlite"), timeout=60)
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS root_metadata "
+            "(file_name TEXT PRIMARY KEY, size INTEGER, mtime TEXT, metadata TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS num_entries "
+            "(file_name TEXT, tree_name TEXT, size INTEGER, mtime TEXT, num_entries INTEGER, "
+            "PRIMARY KEY (file_name, tree_name))"
+        )
+    return connection
+
+
+def __read_metadata_cache(file_name, size, mtime):
+
+    connection = __connect_metadata_cache()
+    try:
+        row = connection.execute(
+            "SELECT metadata FROM root_metadata WHERE file_name=? AND size=? AND mtime=?",
+            (__get_metadata_cache_key(file_name), size, mtime),
+        ).fetchone()
+    finally:
+        connection.close()
+
+    if row is None:
+        return None
+    metadata = json.loads(row[0])
+    if metadata.get("version") != metadata_version:
+        return None
+    return metadata
+
+
+def get_cached_root_file_metadata(file_name):
+    """Return the metadata of a ROOT file from the on-disk cache, without opening the file.
+
+    Args:
+        file_name (str)
+
+    Returns:
+        dict or None: See read_root_file_metadata, None if the file is not in
+            cache or has changed since it was cached
+    """
+
+    identity = get_file_identity(file_name)
+    if identity is None:
+        return None
+
+    return __read_metadata_cache(file_name, *identity)
+
+
+def get_root_file_metadata(file_name, use_cache=True, refresh_cache=False):
+    """Return the metadata of a ROOT file, using the on-disk cache.
+
+    The cache is an SQLite database in the cache directory. Entries are keyed
+    by file name and are invalidated when the size or modification time of the
+    file changes.
+
+    Args:
+        file_name (str)
+        use_cache (bool, optional, default=True): Read from and write to cache
+        refresh_cache (bool, optional, default=False): Ignore cached metadata
+            and write the new metadata to cache
+
+    Returns:
+        dict: See read_root_file_metadata
+    """
+
+    identity = get_file_identity(file_name) if use_cache else None
+    if identity is None:
+        return read_root_file_metadata(file_name)
+    size, mtime = identity
+
+    if not refresh_cache:
+        metadata = __read_metadata_cache(file_name, size, mtime)
+        if metadata is not None:
+            return metadata
+
+    metadata = read_root_file_metadata(file_name)
+    connection = __connect_metadata_cache()
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO root_metadata VALUES (?, ?, ?, ?)",
+                (__get_metadata_cache_key(file_name), size, mtime, json.dumps(metadata)),
+            )
+    finally:
+        connection.close()
+
+    return metadata
+
+
+def find_metadata_node(metadata, path):
+    """Return the node at a path such as "directory/tree" in ROOT file metadata.
+
+    Args:
+        metadata (dict): See read_root_file_metadata
+        path (str)
+
+    Returns:
+        dict
+    """
+
+    node = metadata
+    for name in path.strip("/").split("/"):
+        children = {child["name"]: child for child in node["children"]}
+        if name not in children:
+            raise KeyError("%s not found in %s" % (name, node["name"] or "file"))
+        node = children[name]
+
+    return node
+
+
+def iterate_file_entry_ranges(file_names, tree_name, entry_start=None, entry_stop=None, use_cache=True):
+    """Yield the entries to read in each file to read a range of entries of the files concatenated.
+
+    The number of entries of each file is taken from the metadata cache, and
+    only looked up for the files before entry_stop, so that files after the
+    range are never opened.
+
+    Args:
+        file_names (list[str])
+        tree_name (str)
+        entry_start (int or None, optional, default=None): First global entry
+        entry_stop (int or None, optional, default=None): Global entry after
+            the last one
+        use_cache (bool, optional, default=True)
+
+    Yields:
+        tuple[str, int or None, int or None]: File name, local entry start and
+            local entry stop (None when all entries are read)
+    """
+
+    if entry_start is None and entry_stop is None:
+        for file_name in file_names:
+            yield file_name, None, None
+        return
+
+    entry_start = 0 if entry_start is None else entry_start
+    offset = 0
+    for file_name in file_names:
+        if entry_stop is not None and offset >= entry_stop:
+            return
+        num_entries = get_num_entries([file_name], tree_name, use_cache)
+        local_start = max(entry_start - offset, 0)
+        local_stop = num_entries if entry_stop is None else min(entry_stop - offset, num_entries)
+        if local_start < local_stop:
+            yield file_name, local_start, local_stop
+        offset += num_entries
+
+
+def read_num_entries(file_name, tree_name):
+    """Read the number of entries of a TTree, without reading the metadata of its branches.
+
+    Args:
+        file_name (str)
+        tree_name (str)
+
+    Returns:
+        int
+    """
+
+    import uproot
+
+    with uproot.open(file_name) as file_:
+        return file_[tree_name].num_entries
+
+
+def __read_num_entries_cache(file_name, tree_name, size, mtime):
+
+    connection = __connect_metadata_cache()
+    try:
+        row = connection.execute(
+            "SELECT num_entries FROM num_entries WHERE file_name=? AND tree_name=? AND size=? AND mtime=?",
+            (__get_metadata_cache_key(file_name), tree_name, size, mtime),
+        ).fetchone()
+    finally:
+        connection.close()
+
+    return None if row is None else row[0]
+
+
+def get_file_num_entries(file_name, tree_name, use_cache=True, refresh_cache=False):
+    """Return the number of entries of a TTree in a file, using the on-disk cache.
+
+    The number of entries is taken from the cached file metadata if any, else
+    from a cache of numbers of entries. Otherwise only the TTree is read, the
+    metadata of its branches is not, so that counting scales to many files.
+
+    Args:
+        file_name (str)
+        tree_name (str)
+        use_cache (bool, optional, default=True): Read from and write to cache
+        refresh_cache (bool, optional, default=False): Ignore the cache and
+            write the new number of entries to cache
+
+    Returns:
+        int
+    """
+
+    identity = get_file_identity(file_name) if use_cache else None
+    if identity is None:
+        return read_num_entries(file_name, tree_name)
+    size, mtime = identity
+
+    if not refresh_cache:
+        metadata = __read_metadata_cache(file_name, size, mtime)
+        if metadata is not None:
+            return find_metadata_node(metadata, tree_name)["num_entries"]
+        num_entries = __read_num_entries_cache(file_name, tree_name, size, mtime)
+        if num_entries is not None:
+            return num_entries
+
+    num_entries = read_num_entries(file_name, tree_name)
+    connection = __connect_metadata_cache()
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO num_entries VALUES (?, ?, ?, ?, ?)",
+                (__get_metadata_cache_key(file_name), tree_name, size, mtime, num_entries),
+            )
+    finally:
+        connection.close()
+
+    return num_entries
+
+
+def get_num_entries(file_names, tree_name, use_cache=True):
+    """Return the total number of entries of a TTree in several files.
+
+    Args:
+        file_names (list[str])
+        tree_name (str)
+        use_cache (bool, optional, default=True)
+
+    Returns:
+        int
+    """
+
+    return sum(get_file_num_entries(file_name, tree_name, use_cache) for file_name in file_names)
@@ -0,0 +1,167 @@
+import ast
+import functools
+
+
+# Syntax allowed in expressions: arithmetic, comparisons, indexing, attribute
+# access and function calls, but no lambda, comprehension or assignment
+allowed_nodes = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.keyword, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List, ast.Starred,
+    ast.operator, ast.unaryop, ast.cmpop, ast.boolop,
+)
+
+# Only these attributes of the modules can be used, e.g. np.sqrt, and nothing
+# else of the modules can be reached, e.g. np.f2py.os
+allowed_module_attributes = {
+    "ak": {
+        "all", "any", "argcartesian", "argcombinations", "argmax", "argmin",
+        "argsort", "broadcast_arrays", "cartesian", "combinations",
+        "concatenate", "count", "count_nonzero", "drop_none", "fill_none",
+        "firsts", "flatten", "full_like", "is_none", "local_index", "mask",
+        "max", "mean", "min", "nan_to_num", "num", "ones_like", "pad_none",
+        "prod", "ravel", "run_lengths", "singletons", "sort", "std", "sum",
+        "to_numpy", "unflatten", "values_astype", "var", "where", "zeros_like",
+    },
+    "np": {
+        "abs", "absolute", "arccos", "arccosh", "arcsin", "arcsinh", "arctan",
+        "arctan2", "arctanh", "argmax", "argmin", "argsort", "bool_", "ceil",
+        "clip", "cos", "cosh", "cumsum", "deg2rad", "e", "exp", "expm1",
+        "float32", "float64", "floor", "fmod", "hypot", "inf", "int32",
+        "int64", "isfinite", "isinf", "isnan", "log", "log10", "log1p", "log2",
+        "logical_and", "logical_not", "logical_or", "logical_xor", "max",
+        "maximum", "mean", "min", "minimum", "mod", "nan", "pi", "power",
+        "prod", "rad2deg", "rint", "round", "sign", "sin", "sinh", "sort",
+        "sqrt", "square", "std", "sum", "tan", "tanh", "trunc", "unique",
+        "where",
+    },
+}
+
+# Method which can be called on data["branch_name"]
+allowed_data_method = "array"
+
+safe_builtins = {
+    "abs": abs,
+    "len": len,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "round": round,
+    "int": int,
+    "float": float,
+    "bool": bool,
+}
+
+
+def __get_subscript_name(node):
+    """Return the string used in a subscript like data["name"], else None."""
+
+    slice_ = node.slice
+    # Python < 3.9 wraps subscripts in ast.Index
+    if hasattr(ast, "Index") and isinstance(slice_, ast.Index):
+        slice_ = slice_.value
+    if isinstance(slice_, ast.Constant) and isinstance(slice_.value, str):
+        return slice_.value
+    return None
+
+
+def __is_data_subscript(node, data_name):
+
+    return isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == data_name
+
+
+def __check_attribute(node, data_name, expression):
+    """Raise ValueError unless the attribute is an allowed module function or data[...].array."""
+
+    if isinstance(node.value, ast.Name) and node.value.id in allowed_module_attributes:
+        if node.attr not in allowed_module_attributes[node.value.id]:
+            raise ValueError("Attribute %s.%s not allowed in expression: %s" % (node.value.id, node.attr, expression))
+    elif not (__is_data_subscript(node.value, data_name) and node.attr == allowed_data_method):
+        raise ValueError("Attribute %s not allowed in expression: %s" % (node.attr, expression))
+
+
+@functools.lru_cache(maxsize=None)
+def parse_expression(expression, data_name="data"):
+    """Parse and validate an expression.
+
+    Attributes can only be data["branch_name"].array and the functions and
+    constants of ak and np in allowed_module_attributes. Modules can only be
+    used through these attributes.
+
+    Args:
+        expression (str)
+        data_name (str, optional, default="data"): Name of the object which
+            can only be indexed by constant strings, e.g. data["branch_name"]
+
+    Returns:
+        ast.Expression
+    """
+
+    tree = ast.parse(expression.strip(), mode="eval")
+
+    attribute_values = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed_nodes):
+            raise ValueError("Syntax %s not allowed in expression: %s" % (type(node).__name__, expression))
+        if isinstance(node, ast.Attribute):
+            __check_attribute(node, data_name, expression)
+            attribute_values.add(id(node.value))
+        if isinstance(node, ast.Name) and node.id.startswith("_"):
+            raise ValueError("Name %s not allowed in expression: %s" % (node.id, expression))
+        if __is_data_subscript(node, data_name):
+            if __get_subscript_name(node) is None:
+                raise ValueError("%s must be indexed with a string in expression: %s" % (data_name, expression))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in allowed_module_attributes and id(node) not in attribute_values:
+            raise ValueError("Module %s can only be used as %s.function in expression: %s" % (node.id, node.id, expression))
+
+    return tree
+
+
+def get_dependencies(expression, data_name="data"):
+    """Return the names used as data["name"] in an expression, without duplicates.
+
+    Args:
+        expression (str)
+        data_name (str, optional, default="data")
+
+    Returns:
+        list[str]
+    """
+
+    tree = parse_expression(expression, data_name)
+
+    dependencies = []
+    for node in ast.walk(tree):
+        if __is_data_subscript(node, data_name):
+            dependencies.append(__get_subscript_name(node))
+
+    return list(dict.fromkeys(dependencies))
+
+
+@functools.lru_cache(maxsize=None)
+def __compile_expression(expression, data_name):
+
+    return compile(parse_expression(expression, data_name), "<expression>", "eval")
+
+
+def evaluate(expression, namespace, data_name="data"):
+    """Evaluate a validated expression with only the names in namespace available.
+
+    Args:
+        expression (str)
+        namespace (dict[str, object]): Names available in the expression
+        data_name (str, optional, default="data")
+
+    Returns:
+        object
+    """
+
+    names = { node.id for node in ast.walk(parse_expression(expression, data_name)) if isinstance(node, ast.Name) }
+    missing_names = sorted(names - set(namespace) - set(safe_builtins))
+    if len(missing_names) > 0:
+        raise NameError("Unknown name(s) %s in expression: %s" % (", ".join(missing_names), expression))
+
+    code = __compile_expression(expression, data_name)
+    return eval(code, {"__builtins__": safe_builtins}, dict(namespace))
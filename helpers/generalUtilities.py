@@ -1,5 +1,9 @@
+import fnmatch
+import functools
+import heapq
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from helpers import IOUtilities as ioUtl
 
@@ -54,6 +58,43 @@ def make_slice(slice_text):
         return slice(*map(lambda x: int(x.strip()) if x.strip() else None, slice_text.split(':')))
 
 
+def get_entry_range(index, num_entries):
+    """Return the range of entries to read to apply an index on an array.
+
+    Negative and stepped slices are resolved against the number of entries,
+    so that only the entries in between entry_start and entry_stop need to be
+    read. The local index must then be applied to the array read.
+    Examples:
+    > get_entry_range(make_slice(":10"), 1000)
+    (0, 10, slice(None, None, 1))
+    > get_entry_range(make_slice("-10::2"), 1000)
+    (990, 1000, slice(None, None, 2))
+    > get_entry_range(make_slice("-1"), 1000)
+    (999, 1000, 0)
+
+    Args:
+        index (int or slice)
+        num_entries (int)
+
+    Returns:
+        tuple[int, int, int or slice]: entry_start, entry_stop and local index
+    """
+
+    if isinstance(index, int):
+        entry = index + num_entries if index < 0 else index
+        if entry < 0 or entry >= num_entries:
+            raise IndexError("Index %d out of range for %d entries" % (index, num_entries))
+        return entry, entry+1, 0
+
+    start, stop, step = index.indices(num_entries)
+    if step > 0:
+        return start, max(start, stop), slice(None, None, step)
+    elif start > stop:
+        return stop+1, start+1, slice(None, None, step)
+    else:
+        return start, start, slice(None, None, step)
+
+
 def list_to_str(list_, str_for_concatenation=""):
     """Concatenate elements of a list into an str.
 
@@ -76,80 +117,389 @@ def list_to_str(list_, str_for_concatenation=""):
     return text
 
 
-def get_file_names_from_file_name_expansion(file_name_expansion):
-    """Return list of files matching the file name expansion.
+def __split_top_level_commas(text):
+
+    parts = []
+    depth = 0
+    part_start = 0
+    for i, character in enumerate(text):
+        if character == "{":
+            depth += 1
+        elif character == "}":
+            depth -= 1
+        elif character == "," and depth == 0:
+            parts.append(text[part_start:i])
+            part_start = i+1
+    parts.append(text[part_start:])
+
+    return parts
+
+
+def __get_brace_range(text):
+    """Return the elements of a bash sequence expression like 1..10, 01..10, 10..1..2 or a..e, else None."""
+
+    re_match = re.match(r"^(-?[0-9]+)\.\.(-?[0-9]+)(?:\.\.(-?[0-9]+))?$", text)
+    if re_match:
+        first, last = int(re_match.group(1)), int(re_match.group(2))
+        step = abs(int(re_match.group(3) or 1)) or 1
+        padded = any(len(x.lstrip("-")) > 1 and x.lstrip("-").startswith("0") for x in re_match.groups()[:2])
+        width = max(len(re_match.group(1)), len(re_match.group(2))) if padded else 0
+        if first <= last:
+            numbers = range(first, last+1, step)
+        else:
+            numbers = range(first, last-1, -step)
+        return [ "%0*d" % (width, number) for number in numbers ]
+
+    re_match = re.match(r"^([a-zA-Z])\.\.([a-zA-Z])(?:\.\.(-?[0-9]+))?$", text)
+    if re_match:
+        first, last = ord(re_match.group(1)), ord(re_match.group(2))
+        step = abs(int(re_match.group(3) or 1)) or 1
+        if first <= last:
+            return [ chr(x) for x in range(first, last+1, step) ]
+        else:
+            return [ chr(x) for x in range(first, last-1, -step) ]
+
+    return None
+
+
+def expand_braces(text):
+    """Yield the words of a bash brace expansion, in the same order as bash.
+
+    Supports lists {a,b}, sequences {1..10}, zero-padded sequences {01..10},
+    sequences with a step {1..10..2}, letter sequences {a..e} and nested
+    braces. Braces which are not a valid expansion are kept as they are.
+    Examples:
+    > list(expand_braces("file{1..3}.root"))
+    ['file1.root', 'file2.root', 'file3.root']
+    > list(expand_braces("{a,b{08..10}}"))
+    ['a', 'b08', 'b09', 'b10']
 
     Args:
-        file_name_expansion (str)
+        text (str)
+
+    Yields:
+        str
+    """
+
+    search_start = 0
+    while True:
+        brace_start = text.find("{", search_start)
+        if brace_start < 0:
+            yield text
+            return
+
+        # Find the matching closing brace
+        depth = 0
+        brace_end = -1
+        for i in range(brace_start, len(text)):
+            if text[i] == "{":
+                depth += 1
+            elif text[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    brace_end = i
+                    break
+        if brace_end < 0:
+            yield text
+            return
+
+        content = text[brace_start+1:brace_end]
+        alternatives = __split_top_level_commas(content)
+        if len(alternatives) == 1:
+            alternatives = __get_brace_range(content)
+        if alternatives is not None:
+            break
+
+        # Not a brace expansion, look for the next one
+        search_start = brace_start+1
+
+    prefix = text[:brace_start]
+    suffix = text[brace_end+1:]
+    for alternative in alternatives:
+        for expanded_alternative in expand_braces(alternative):
+            for expanded_suffix in expand_braces(suffix):
+                yield prefix + expanded_alternative + expanded_suffix
+
+
+def has_glob_pattern(text):
+    """Return whether a file name has glob wildcards *, ? or [...].
+
+    Args:
+        text (str)
 
     Returns:
-        list[str]
+        bool
     """
 
-    file_names = []
+    return "*" in text or "?" in text or "[" in text
+
+
+@functools.lru_cache(maxsize=None)
+def __compile_glob_pattern(pattern):
+
+    # bash accepts both [!...] and [^...] for negation, fnmatch only [!...]
+    return re.compile(fnmatch.translate(pattern.replace("[^", "[!")))
 
-    re_search = re.search("(.*)\{([0-9]+)(\.\.|,)([0-9]+)\}(.*)", file_name_expansion)
-    file_name_start = re_search.group(1)
-    file_name_end = re_search.group(5)
-    part_start = int(re_search.group(2))
-    part_end = int(re_search.group(4))
-    how = re_search.group(3)
 
-    if how == "..":
-        parts = range(part_start, part_end+1)
-    elif how == ",":
-        parts = (part_start, part_end)
+def __join_path(directory, name):
+
+    if directory == "":
+        return name
+    elif directory.endswith("/"):
+        return directory + name
     else:
-        raise NotImplementedError
+        return directory + "/" + name
 
-    for part in parts:
-        file_name = file_name_start + str(part) + file_name_end
-        exists = ioUtl.file_exists(file_name)
-        if exists:
-            file_names.append(file_name)
 
-    return file_names
+def iterate_glob(pattern):
+    """Yield the files matching a glob pattern, in sorted order within each directory.
 
+    Directories are listed one level at a time with the storage backend of
+    the file, only when a path component has wildcards. As in bash, * and ?
+    do not match names starting with a dot unless the pattern does.
+    Authentication errors exit with the voms proxy instructions, directories
+    which cannot be listed are skipped.
+
+    Args:
+        pattern (str): Local or remote path with wildcards *, ? or [...]
+
+    Yields:
+        str
+    """
+
+    redirector = ioUtl.get_redirector(pattern)
+    logical_pattern = ioUtl.get_logical_file_name(pattern)
+    prefix = "" if redirector is None else redirector + "/"
+
+    components = logical_pattern.split("/")
+    if logical_pattern.startswith("/"):
+        base, components = "/", components[1:]
+    else:
+        base = ""
+
+    def walk(directory, components):
+        component, other_components = components[0], components[1:]
+
+        if not has_glob_pattern(component):
+            path = __join_path(directory, component)
+            if len(other_components) > 0:
+                yield from walk(path, other_components)
+            elif ioUtl.file_exists(prefix + path):
+                yield prefix + path
+            return
+
+        names = ioUtl.list_directory(prefix + (directory or "."))
+        if names is None:
+            return
+        regex = __compile_glob_pattern(component)
+        names = sorted(
+            name for name in names
+            if regex.match(name) and (component.startswith(".") or not name.startswith("."))
+        )
+        for name in names:
+            path = __join_path(directory, name)
+            if len(other_components) > 0:
+                yield from walk(path, other_components)
+            else:
+                yield prefix + path
+
+    yield from walk(base, components)
 
-def make_file_list(files_argument):
-    """Make list of ROOT files to merge.
+
+def iterate_file_name_expansion(file_name_expansion, chunk_size=1000):
+    """Yield the files matching a file name expansion with braces and wildcards.
+
+    Braces are expanded first, then wildcards, as in bash. Expanded names
+    without wildcards are checked for existence in bulk, chunk_size at a time.
 
     Args:
-        files_argument (str):
-            Comma separated ROOT file names e.g. file1.root,file2.root or
-            text file name with a ROOT file name on each line or filename
-            expension. Can combine several syntaxes separated by +.
+        file_name_expansion (str)
+        chunk_size (int, optional, default=1000)
+
+    Yields:
+        str
+    """
+
+    candidates = []
+    for file_name in expand_braces(file_name_expansion):
+        if has_glob_pattern(file_name):
+            for candidate, exists in zip(candidates, ioUtl.files_exist(candidates)):
+                if exists: yield candidate
+            candidates = []
+            yield from iterate_glob(file_name)
+        else:
+            candidates.append(file_name)
+            if len(candidates) >= chunk_size:
+                for candidate, exists in zip(candidates, ioUtl.files_exist(candidates)):
+                    if exists: yield candidate
+                candidates = []
+
+    for candidate, exists in zip(candidates, ioUtl.files_exist(candidates)):
+        if exists: yield candidate
+
+
+def get_file_names_from_file_name_expansion(file_name_expansion):
+    """Return list of files matching the file name expansion.
+
+    Args:
+        file_name_expansion (str)
 
     Returns:
         list[str]
     """
 
-    root_files = []
+    return list(iterate_file_name_expansion(file_name_expansion))
+
+
+def iterate_file_list(files_argument):
+    """Yield the ROOT files of a files argument, expanding patterns lazily.
+
+    Files appearing several times, e.g. in several syntaxes combined with +,
+    are only yielded the first time.
+
+    Args:
+        files_argument (str): See make_file_list
+
+    Yields:
+        str
+    """
+
+    yielded_files = set()
     for files_arg in files_argument.split("+"):
-        # If the file argument has file name expansion (not really a regex, ls does not support regex)
+        # If the file argument has file name expansion
         if "*" in files_arg or "!" in files_arg or "?" in files_arg or "^" in files_arg \
         or "[" in files_arg or "{" in files_arg:
-
-            redirector = ioUtl.get_redirector(files_arg)
-
-            if redirector is None:
-                root_files += gUtl.run_bash_command("ls %s 2>/dev/null" %files_arg).split("\n")
-            else:
-                if "{" in files_arg:
-                    root_files += get_file_names_from_file_name_expansion(files_arg)
-                else:
-                    raise NotImplementedError
+            root_files = iterate_file_name_expansion(files_arg)
 
         # If list of ROOT files in txt file
         elif files_arg.endswith(".txt"):
             with open (files_arg, "r") as txt_file:
-                root_files += [ x.replace("\n", "") for x in txt_file.readlines() ]
+                root_files = [ x.replace("\n", "") for x in txt_file.readlines() ]
         # Else we assume coma separated list of ROOT files
         else:
-            root_files += files_arg.split(",")
+            root_files = files_arg.split(",")
 
-    # In case there were empty lines in txt file or extra comas, remove empty strings
-    root_files = [ x for x in root_files if x != "" ]
-    
-    return root_files
+        # In case there were empty lines in txt file or extra comas, remove empty strings
+        for root_file in root_files:
+            if root_file != "" and root_file not in yielded_files:
+                yielded_files.add(root_file)
+                yield root_file
+
+
+def parse_shard(shard_text):
+    """Return the index and number of shards from a text like 2/10.
+
+    Shard indices start at 0.
+
+    Args:
+        shard_text (str)
+
+    Returns:
+        tuple[int, int]
+    """
+
+    re_match = re.match(r"^\s*([0-9]+)\s*/\s*([0-9]+)\s*$", shard_text)
+    if not re_match:
+        raise ValueError("Invalid shard %s, expected i/N, e.g. 0/10" % shard_text)
+    shard_index, n_shards = int(re_match.group(1)), int(re_match.group(2))
+    if n_shards < 1 or shard_index >= n_shards:
+        raise ValueError("Invalid shard %s, expected 0 <= i < N" % shard_text)
+
+    return shard_index, n_shards
+
+
+def get_file_weights(file_names, tree_name=None, use_cache=True, max_workers=16):
+    """Return the number of entries or the size of each file, to balance work between jobs.
+
+    Args:
+        file_names (list[str])
+        tree_name (str or None, optional, default=None): If given, the weight is
+            the number of entries of this TTree, else the file size in bytes
+        use_cache (bool, optional, default=True): Use the ROOT files metadata cache
+        max_workers (int, optional, default=16): Number of files looked up at
+            the same time
+
+    Returns:
+        list[int]
+
+    Raises:
+        OSError: If the weight of a file cannot be determined. Independent jobs
+            must all get the same weights to make disjoint shards covering all
+            files, so a failure is not replaced by a default weight.
+    """
+
+    def get_weight(file_name):
+        if tree_name is not None:
+            try:
+                return ioUtl.get_num_entries([file_name], tree_name, use_cache)
+            except Exception as error:
+                raise OSError("Could not read the number of entries of %s in %s to make shards: %s" % (tree_name, file_name, error)) from error
+        identity = ioUtl.get_file_identity(file_name)
+        if identity is None:
+            raise OSError("Could not read the size of %s to make shards" % file_name)
+        return identity[0]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_weight, file_names))
+
+
+def shard_file_list(file_names, shard_index, n_shards, weights=None):
+    """Return the files of one shard, with shards of balanced total weight.
+
+    Files are assigned from the heaviest to the lightest to the shard with the
+    lowest total weight so far. The partition only depends on the file names
+    and weights, so that independent jobs get disjoint shards covering all
+    files. Files keep their order within a shard.
+
+    Args:
+        file_names (list[str])
+        shard_index (int)
+        n_shards (int)
+        weights (list[int] or None, optional, default=None): Weight of each
+            file, e.g. from get_file_weights. All files weigh the same if None.
+
+    Returns:
+        list[str]
+    """
+
+    if weights is None:
+        weights = [ 1 for file_name in file_names ]
+
+    # Heap of (total weight, number of files, shard index)
+    shards = [ (0, 0, ishard) for ishard in range(n_shards) ]
+    file_shards = {}
+    for ifile in sorted(range(len(file_names)), key=lambda i: (-weights[i], file_names[i])):
+        shard_weight, shard_n_files, ishard = heapq.heappop(shards)
+        heapq.heappush(shards, (shard_weight + weights[ifile], shard_n_files + 1, ishard))
+        file_shards[ifile] = ishard
 
+    return [ file_name for ifile, file_name in enumerate(file_names) if file_shards[ifile] == shard_index ]
+
+
+def make_file_list(files_argument, shard=None, tree_name=None, use_cache=True):
+    """Make list of ROOT files to merge.
+
+    Args:
+        files_argument (str):
+            Comma separated ROOT file names e.g. file1.root,file2.root or
+            text file name with a ROOT file name on each line or filename
+            expension. Can combine several syntaxes separated by +.
+        shard (str or None, optional, default=None): Only return the files
+            of shard i out of N, e.g. 0/10, balanced by entries or file size
+        tree_name (str or None, optional, default=None): With shard, balance
+            by number of entries of this TTree instead of by file size
+        use_cache (bool, optional, default=True): With shard and tree_name,
+            use the ROOT files metadata cache
+
+    Returns:
+        list[str]: Files without duplicates, in the order of files_argument
+    """
+
+    root_files = list(iterate_file_list(files_argument))
+
+    if shard is not None:
+        shard_index, n_shards = parse_shard(shard)
+        weights = get_file_weights(root_files, tree_name, use_cache)
+        root_files = shard_file_list(root_files, shard_index, n_shards, weights)
+
+    return root_files
@@ -0,0 +1,145 @@
+def format_bytes(n_bytes):
+    """Return a number of bytes as a human readable str, e.g. 1.28 MB.
+
+    Args:
+        n_bytes (int)
+
+    Returns:
+        str
+    """
+
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(n_bytes) < 1000:
+            break
+        n_bytes = n_bytes / 1000
+    else:
+        unit = "TB"
+
+    if unit == "B":
+        return "%d %s" % (n_bytes, unit)
+    else:
+        return "%.2f %s" % (n_bytes, unit)
+
+
+def get_branch_sizes(tree_node):
+    """Return the sizes of all branches of a TTree, including sub-branches.
+
+    Sizes are taken from the TBranch metadata (fZipBytes, fTotBytes and
+    number of baskets), no basket is read or decompressed.
+
+    Args:
+        tree_node (dict): TTree node of the metadata returned by
+            IOUtilities.get_root_file_metadata
+
+    Returns:
+        list[dict]: Dictionaries with keys "name", "compressed_bytes",
+            "uncompressed_bytes" and "num_baskets", sorted by decreasing
+            compressed size
+    """
+
+    branch_sizes = []
+
+    def add_branches(branches, prefix):
+        for branch in branches:
+            name = prefix + branch["name"]
+            branch_sizes.append({
+                "name": name,
+                "compressed_bytes": branch["compressed_bytes"],
+                "uncompressed_bytes": branch["uncompressed_bytes"],
+                "num_baskets": branch["num_baskets"],
+            })
+            add_branches(branch["children"], name + "/")
+
+    add_branches(tree_node["children"], "")
+
+    return sorted(branch_sizes, key=lambda x: -x["compressed_bytes"])
+
+
+def get_collection_name(branch_name):
+    """Return the collection of a branch following the NanoAOD convention, e.g. Jet_* for Jet_pt.
+
+    Args:
+        branch_name (str)
+
+    Returns:
+        str: Branch name itself if it is not part of a collection
+    """
+
+    top_branch_name = branch_name.split("/")[0]
+    if "_" in top_branch_name.strip("_"):
+        return top_branch_name.strip("_").split("_")[0] + "_*"
+    else:
+        return top_branch_name
+
+
+def get_collection_sizes(branch_sizes):
+    """Sum branch sizes per collection.
+
+    Args:
+        branch_sizes (list[dict]): See get_branch_sizes
+
+    Returns:
+        list[dict]: Dictionaries with keys "name", "num_branches",
+            "compressed_bytes", "uncompressed_bytes" and "num_baskets",
+            sorted by decreasing compressed size
+    """
+
+    collections = {}
+    for branch in branch_sizes:
+        name = get_collection_name(branch["name"])
+        if name not in collections:
+            collections[name] = {"name": name, "num_branches": 0, "compressed_bytes": 0, "uncompressed_bytes": 0, "num_baskets": 0}
+        collection = collections[name]
+        collection["num_branches"] += 1
+        for key in ("compressed_bytes", "uncompressed_bytes", "num_baskets"):
+            collection[key] += branch[key]
+
+    return sorted(collections.values(), key=lambda x: -x["compressed_bytes"])
+
+
+def print_sizes(tree_node, name_width=45):
+    """Print the size of each branch and each collection of a TTree, and the total size.
+
+    Args:
+        tree_node (dict): See get_branch_sizes
+        name_width (int, optional, default=45)
+    """
+
+    branch_sizes = get_branch_sizes(tree_node)
+    collection_sizes = get_collection_sizes(branch_sizes)
+    total_compressed_bytes = sum(x["compressed_bytes"] for x in branch_sizes)
+    total_uncompressed_bytes = sum(x["uncompressed_bytes"] for x in branch_sizes)
+    total_num_baskets = sum(x["num_baskets"] for x in branch_sizes)
+
+    formatter = "{0:%d.%d} | {1:>8} | {2:>10} | {3:>12} | {4:>6} | {5:>7} | {6:>10}" % (name_width, name_width)
+
+    def print_table(first_column, rows):
+        print(formatter.format(first_column, "fraction", "compressed", "uncompressed", "ratio", "baskets", "avg basket"))
+        print("-"*name_width + "-+-" + "-+-".join("-"*width for width in (8, 10, 12, 6, 7, 10)))
+        for row in rows:
+            name = row["name"]
+            if len(name) > name_width:
+                name = name[:name_width-3] + "..."
+            compressed_bytes = row["compressed_bytes"]
+            uncompressed_bytes = row["uncompressed_bytes"]
+            num_baskets = row["num_baskets"]
+            print(formatter.format(
+                name,
+                "%.1f%%" % (100 * compressed_bytes / total_compressed_bytes) if total_compressed_bytes > 0 else "-",
+                format_bytes(compressed_bytes),
+                format_bytes(uncompressed_bytes),
+                "%.2f" % (uncompressed_bytes / compressed_bytes) if compressed_bytes > 0 else "-",
+                num_baskets,
+                format_bytes(compressed_bytes / num_baskets) if num_baskets > 0 else "-",
+            ))
+
+    print_table("branch", branch_sizes)
+    print("")
+    collection_rows = [ dict(x, name="%s (%d)" % (x["name"], x["num_branches"])) for x in collection_sizes ]
+    total_row = {
+        "name": "Total (%d)" % len(branch_sizes),
+        "compressed_bytes": total_compressed_bytes,
+        "uncompressed_bytes": total_uncompressed_bytes,
+        "num_baskets": total_num_baskets,
+    }
+    print_table("collection (branches)", collection_rows + [total_row])
@@ -0,0 +1,178 @@
+import os
+import sys
+import tempfile
+
+from helpers import IOUtilities as ioUtl
+
+
+# Responses of XRootD servers, as client status code, server error number and message
+responses = {
+    "not_found": (400, 3011, "[ERROR] Server responded with an error: [3011] Unable to locate %s; no such file or directory\n"),
+    "exists": (400, 3018, "[ERROR] Server responded with an error: [3018] Unable to create %s; file exists\n"),
+    "not_authorized": (400, 3010, "[ERROR] Server responded with an error: [3010] Unable to access %s; permission denied\n"),
+    "unsupported": (400, 3013, "[ERROR] Server responded with an error: [3013] Unsupported request for %s\n"),
+    "server_error": (400, 3012, "[ERROR] Server responded with an error: [3012] Internal server error for %s\n"),
+    "authentication_failed": (204, 0, "[FATAL] Auth failed: No protocols left to try for %s\n"),
+    "operation_expired": (206, 0, "[ERROR] Operation expired for %s\n"),
+}
+
+
+class StandInStatus:
+    """Status of a request, with the attributes of XRootD.client.responses.XRootDStatus.
+
+    Args:
+        response (str or None, optional, default=None): Key of responses, None for success
+        path (str, optional, default="")
+    """
+
+    def __init__(self, response=None, path=""):
+        if response is None:
+            self.code, self.errno, self.message = 0, 0, ""
+        else:
+            self.code, self.errno, message = responses[response]
+            self.message = message % path
+        self.ok = response is None
+
+
+class StandInEntry:
+    """File size and modification time or directory entry name, as returned by XRootD.client.FileSystem."""
+
+    def __init__(self, name=None, size=None, modtime=None):
+        self.name = name
+        self.size = size
+        self.modtime = modtime
+
+
+class StandInFileSystem:
+    """Stand-in for XRootD.client.FileSystem serving the files of a local directory.
+
+    Requests can fail as on real servers, e.g. with an expired voms proxy
+    or on old servers which do not support stat.
+
+    Args:
+        root_directory (str): Local directory served as /
+        failures (dict[str, str] or None, optional, default=None): Response
+            of each failing method (stat, dirlist or mkdir), see responses
+        list_full_paths (bool, optional, default=False): Give directory
+            entries as full paths with a trailing / for directories, as some
+            servers do, instead of names
+    """
+
+    def __init__(self, root_directory, failures=None, list_full_paths=False):
+        self.root_directory = root_directory
+        self.failures = failures if failures is not None else {}
+        self.list_full_paths = list_full_paths
+
+    def __get_local_path(self, path):
+        return os.path.join(self.root_directory, path.lstrip("/"))
+
+    def stat(self, path, timeout=0):
+        if "stat" in self.failures:
+            return StandInStatus(self.failures["stat"], path), None
+        try:
+            stat = os.stat(self.__get_local_path(path))
+        except FileNotFoundError:
+            return StandInStatus("not_found", path), None
+        return StandInStatus(), StandInEntry(size=stat.st_size, modtime=int(stat.st_mtime))
+
+    def dirlist(self, path, flags=0, timeout=0):
+        if "dirlist" in self.failures:
+            return StandInStatus(self.failures["dirlist"], path), None
+        try:
+            entries = list(os.scandir(self.__get_local_path(path)))
+        except (FileNotFoundError, NotADirectoryError):
+            return StandInStatus("not_found", path), None
+        if self.list_full_paths:
+            names = [ path.rstrip("/") + "/" + x.name + ("/" if x.is_dir() else "") for x in entries ]
+        else:
+            names = [ x.name for x in entries ]
+        return StandInStatus(), [ StandInEntry(name=name) for name in names ]
+
+    def mkdir(self, path, flags=0, mode=0, timeout=0):
+        if "mkdir" in self.failures:
+            return StandInStatus(self.failures["mkdir"], path), None
+        try:
+            # flags 1 is MkDirFlags.MAKEPATH
+            if flags & 1:
+                os.makedirs(self.__get_local_path(path))
+            else:
+                os.mkdir(self.__get_local_path(path))
+        except FileExistsError:
+            return StandInStatus("exists", path), None
+        except FileNotFoundError:
+            return StandInStatus("not_found", path), None
+        return StandInStatus(), None
+
+
+def __get_outcome(function):
+    """Return the result of a function, or the class of the OSError it raises."""
+
+    try:
+        return function()
+    except OSError as error:
+        return type(error)
+
+
+def __get_checks(directory):
+    """Return the checks of the backend, as description, options of the stand-in, function of the backend and expected outcome."""
+
+    modtime = str(int(os.stat(os.path.join(directory, "store", "a", "x.root")).st_mtime))
+
+    return [
+        ("exists on a file", {}, lambda x: x.exists("/store/a/x.root"), True),
+        ("exists on a directory", {}, lambda x: x.exists("/store/a"), True),
+        ("exists on a missing file", {}, lambda x: x.exists("/store/a/missing.root"), False),
+        ("exists with failed authentication", {"failures": {"stat": "authentication_failed"}}, lambda x: x.exists("/store/a/x.root"), ioUtl.AuthenticationError),
+        ("exists without authorization", {"failures": {"stat": "not_authorized"}}, lambda x: x.exists("/store/a/x.root"), ioUtl.AuthenticationError),
+        ("exists on a server without stat", {"failures": {"stat": "unsupported"}}, lambda x: x.exists("/store/a/x.root"), ioUtl.UnsupportedOperationError),
+        ("exists with a server error", {"failures": {"stat": "server_error"}}, lambda x: x.exists("/store/a/x.root"), ioUtl.ServerError),
+        ("exists with an expired operation", {"failures": {"stat": "operation_expired"}}, lambda x: x.exists("/store/a/x.root"), ioUtl.ServerError),
+        ("stat on a file", {}, lambda x: x.stat("/store/a/x.root"), (10, modtime)),
+        ("stat on a missing file", {}, lambda x: x.stat("/store/a/missing.root"), FileNotFoundError),
+        ("stat with failed authentication", {"failures": {"stat": "authentication_failed"}}, lambda x: x.stat("/store/a/x.root"), ioUtl.AuthenticationError),
+        ("stat on a server without stat", {"failures": {"stat": "unsupported"}}, lambda x: x.stat("/store/a/x.root"), ioUtl.UnsupportedOperationError),
+        ("listdir", {}, lambda x: sorted(x.listdir("/store")), ["a", "b"]),
+        ("listdir with full paths", {"list_full_paths": True}, lambda x: sorted(x.listdir("/store")), ["a", "b"]),
+        ("listdir on a missing directory", {}, lambda x: x.listdir("/store/missing"), FileNotFoundError),
+        ("listdir with failed authentication", {"failures": {"dirlist": "authentication_failed"}}, lambda x: x.listdir("/store"), ioUtl.AuthenticationError),
+        ("listdir without authorization", {"failures": {"dirlist": "not_authorized"}}, lambda x: x.listdir("/store"), ioUtl.AuthenticationError),
+        ("listdir on a server without dirlist", {"failures": {"dirlist": "unsupported"}}, lambda x: x.listdir("/store"), ioUtl.UnsupportedOperationError),
+        ("mkdir with parents", {}, lambda x: (x.mkdir("/store/c/d"), x.exists("/store/c/d"))[1], True),
+        ("mkdir on an existing directory", {}, lambda x: x.mkdir("/store/b", exist_ok=True), None),
+        ("mkdir on an existing directory, not exist_ok", {}, lambda x: x.mkdir("/store/b"), ioUtl.ServerError),
+        ("mkdir with failed authentication", {"failures": {"mkdir": "authentication_failed"}}, lambda x: x.mkdir("/store/e"), ioUtl.AuthenticationError),
+    ]
+
+
+def main():
+    """Check the XRootD storage backend of IOUtilities with a stand-in server, for successful and failing requests.
+
+    Does not need the XRootD Python bindings nor a server.
+
+    Example:
+    $ PYTHONPATH=/path/to/utilities python /path/to/utilities/helpers/xrootdStandIn.py
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "store", "a"))
+        os.makedirs(os.path.join(directory, "store", "b"))
+        with open(os.path.join(directory, "store", "a", "x.root"), "wb") as file_:
+            file_.write(10 * b"\0")
+
+        n_failed_checks = 0
+        for description, options, function, expected_outcome in __get_checks(directory):
+            storage = ioUtl.XRootDStorage("root://stand-in.local:1094", StandInFileSystem(directory, **options))
+            outcome = __get_outcome(lambda: function(storage))
+            passed = outcome == expected_outcome
+            if not passed:
+                n_failed_checks += 1
+            outcome_text = outcome.__name__ if isinstance(outcome, type) else repr(outcome)
+            print("%-4s %-50s %s" % ("OK" if passed else "FAIL", description, outcome_text))
+
+    if n_failed_checks > 0:
+        print("ERROR: %d checks failed" % n_failed_checks)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
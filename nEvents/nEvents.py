@@ -1,7 +1,9 @@
-import uproot
+import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from helpers import generalUtilities as gUtl
+from helpers import IOUtilities as ioUtl
 
 
 def __get_arguments():
@@ -26,10 +28,50 @@ def __get_arguments():
         "-filter", "--filter",
         help="Filter the array using the specified array. Example synthax: data.[\"branch_name\"]==1. No space allowed!",
     )
+    parser.add_argument(
+        "-j", "--jobs",
+        help="Number of files opened in parallel. Default=%(default)s.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-shard", "--shard",
+        help="Only count the files of shard i out of N, e.g. 0/10. Shards are balanced by number of entries.",
+    )
+    parser.add_argument(
+        "-nc", "--no_cache",
+        action="store_true",
+        help="Do not use the on-disk cache of numbers of entries and ROOT files metadata.",
+    )
+    parser.add_argument(
+        "-rc", "--refresh_cache",
+        action="store_true",
+        help="Read the numbers of entries again and update the on-disk cache.",
+    )
 
     return parser.parse_args()
 
 
+def __count_entries(file_name, ttree_name, use_cache=True, refresh_cache=False):
+    """Return the number of entries in a TTree, reading only the TTree and not its branches.
+
+    Args:
+        file_name (str)
+        ttree_name (str)
+        use_cache (bool, optional, default=True)
+        refresh_cache (bool, optional, default=False)
+
+    Returns:
+        tuple[int, Exception or None]: Number of entries (0 if the file could
+            not be read) and exception raised when reading the file
+    """
+
+    try:
+        return ioUtl.get_file_num_entries(file_name, ttree_name, use_cache, refresh_cache), None
+    except Exception as exception:
+        return 0, exception
+
+
 def main():
     """Return the number of events in a list of ROOT files.
 
@@ -42,19 +84,39 @@ def main():
     file2.root
     $ # the + can combine several syntaxes:
     $ python nEvents -f list.txt+file{5..10}.root 
+    $ # open 16 files in parallel:
+    $ python nEvents -f list.txt -j 16
+    $ # count the second of 10 shards of files with balanced numbers of entries:
+    $ python nEvents -f list.txt -shard 1/10
     """
 
     args = __get_arguments()
 
-    root_files = gUtl.make_file_list(args.files)
+    # Files are counted while file name expansions are still being resolved
+    # Sharding needs the full list of files
+    if args.shard:
+        root_files = gUtl.make_file_list(args.files, args.shard, args.ttree, not args.no_cache)
+    else:
+        root_files = gUtl.iterate_file_list(args.files)
 
     # Counting number of events
+    def count_entries(file_name):
+        return (file_name,) + __count_entries(file_name, args.ttree, not args.no_cache, args.refresh_cache)
+
+    if args.jobs > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(count_entries, root_files))
+    else:
+        results = [ count_entries(file_name) for file_name in root_files ]
+
     n_events = 0
-    for file_name in root_files:
-        file_ = uproot.open(file_name)
-        events = file_[args.ttree]
-        f0 = events.keys()[0]
-        n_events += events[f0].num_entries
+    n_failures = 0
+    for file_name, n_entries, exception in results:
+        if exception is not None:
+            error_message = str(exception).strip().split("\n")[0]
+            print("ERROR: Could not count events in %s: %s" % (file_name, error_message), file=sys.stderr)
+            n_failures += 1
+        n_events += n_entries
 
     # Human readable output
     if args.human_readable:
@@ -73,6 +135,10 @@ def main():
 
     print(n_events_str)
 
+    if n_failures > 0:
+        print("ERROR: %d/%d files could not be read, they are not included in the number of events." % (n_failures, len(results)), file=sys.stderr)
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
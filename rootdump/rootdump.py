@@ -1,6 +1,6 @@
 import argparse
+import signal
 import sys
-import re
 from collections import Counter
 
 import pandas as pd
@@ -8,21 +8,127 @@ import uproot
 import numpy as np
 import awkward as ak
 
-from helpers.generalUtilities import make_slice
+from helpers.generalUtilities import make_slice, make_file_list, get_entry_range
+from helpers import IOUtilities as ioUtl
+from helpers import expressionUtilities as exprUtl
 
 
-if __name__ == "__main__":
+# ak.to_pandas was renamed ak.to_dataframe in awkward 2
+if hasattr(ak, "to_dataframe"):
+    _to_data_frame = ak.to_dataframe
+else:
+    _to_data_frame = ak.to_pandas
+
+
+def _shift_index(data_frame, offset, step=1):
+    """Shift the entry numbers of a data frame made from a chunk.
+
+    Entry i of the chunk gets the number offset + step * i.
+    Single underscore so that it can be used in _TableWriter, where __names
+    are mangled.
     """
-    Example:
-    $ rdump -f QCD_Pt_3200toInf_TuneCP5_13TeV_pythia8.root -b Events/FatJet_tau1 -l -i :10
-    will print the FatJet _au1 variable for the first 10 events of file QCD_Pt_3200toInf_TuneCP5_13TeV_pythia8.root
+
+    if isinstance(data_frame.index, pd.MultiIndex):
+        data_frame.index = data_frame.index.set_levels(data_frame.index.levels[0] * step + offset, level=0)
+    else:
+        data_frame.index = data_frame.index * step + offset
+
+
+class _ChunkData:
+    """Stand-in for the uproot file in --filter and --create_branches expressions.
+
+    data["branch_name"].array() returns the already read content of the branch
+    (the current chunk in streaming mode) instead of reading it again.
     """
 
-    ## Parse arguments
+    def __init__(self, branches):
+        self.__branches = branches
+
+    def __getitem__(self, branch_name):
+        if branch_name not in self.__branches:
+            raise KeyError("Branch %s was not read" % branch_name)
+        return _ChunkBranch(self.__branches[branch_name])
+
+
+class _ChunkBranch:
+
+    def __init__(self, array):
+        self.__array = array
+
+    def array(self):
+        return self.__array
+
+
+class _TableWriter:
+    """Write branches to a columnar file, chunk by chunk.
+
+    The format is given by the file extension: .parquet, .arrow/.ipc/.feather
+    (Arrow IPC file format, which is also Feather V2) or .csv.
+    """
+
+    formats = {
+        ".parquet": "parquet",
+        ".arrow": "arrow",
+        ".ipc": "arrow",
+        ".feather": "arrow",
+        ".csv": "csv",
+    }
+
+    def __init__(self, file_name):
+        self.__file_name = file_name
+        self.__writer = None
+        self.n_entries = 0
+
+        extension = "." + file_name.split(".")[-1].lower()
+        if extension not in self.formats:
+            print("ERROR: Unknown output format %s. Choices: %s." % (extension, ", ".join(self.formats)))
+            sys.exit(1)
+        self.__format = self.formats[extension]
+
+        if self.__format != "csv":
+            try:
+                import pyarrow
+            except ImportError:
+                print("ERROR: pyarrow is needed to write %s files." % self.__format)
+                sys.exit(1)
+
+    def write(self, branches):
+        """Write a chunk of branches, given as dict of arrays of same length."""
+
+        columns = { name.split("/")[-1]: branch for name, branch in branches.items() }
+        offset = self.n_entries
+        self.n_entries += len(next(iter(columns.values())))
+
+        if self.__format == "csv":
+            data_frame = _to_data_frame(ak.zip(columns, depth_limit=1), how="outer")
+            # Entry numbers continue from the previous chunks
+            _shift_index(data_frame, offset)
+            data_frame.to_csv(self.__file_name, mode="w" if offset == 0 else "a", header=offset == 0)
+            return
+
+        import pyarrow.parquet
+        import pyarrow.ipc
+
+        table = ak.to_arrow_table(ak.zip(columns, depth_limit=1))
+        if self.__writer is None:
+            if self.__format == "parquet":
+                self.__writer = pyarrow.parquet.ParquetWriter(self.__file_name, table.schema)
+            else:
+                self.__writer = pyarrow.ipc.new_file(self.__file_name, table.schema)
+        self.__writer.write_table(table)
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+        print("Wrote %d entries to %s" % (self.n_entries, self.__file_name))
+
+
+def __get_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-f", "--file",
-        help="File to ls",
+        help="ROOT files separated by a comma, or filename expansion, or txt file with list of ROOT files. "
+             "Several syntaxes can be combined with +. The files are read as one dataset.",
         required=True,
     )
     parser.add_argument(
@@ -34,7 +140,8 @@ if __name__ == "__main__":
         "-cb", "--create_branches",
         help="Create a branch on the fly. "
              "Syntax: column1_name:expression1;column2_name:expression2 "
-             "Use data[\"branch_name\"].array()==1 to build the expressions.",
+             "Use data[\"branch_name\"].array()==1 to build the expressions. "
+             "Expressions can use common ak and np functions (e.g. ak.num, np.sqrt) and the branches created before.",
     )
     parser.add_argument(
         "-i", "--index",
@@ -51,7 +158,8 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "-filter", "--filter",
-        help="Filter the array using the specified array. Example synthax: data[\"branch_name\"].array()==1",
+        help="Filter the array using the specified array. Example synthax: data[\"branch_name\"].array()==1. "
+             "Only the branches used in the expression are read.",
     )
     parser.add_argument(
         "-pd", "--pandas",
@@ -78,6 +186,11 @@ if __name__ == "__main__":
         default="fraction",
         help="Format in which to express output from unique values counting. Choices=%(choices)s. Default=%(default)s",
     )
+    parser.add_argument(
+        "-top", "--top",
+        help="With --count, only print the given number of most frequent values",
+        type=int,
+    )
     parser.add_argument(
         "-n", "--number",
         help="Print as table: entry number | value",
@@ -85,7 +198,8 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "-a", "--apply",
-        help="Apply a function on the array. Example synthax: ak.sum(ARRAY,axis=1). No space allowed!",
+        help="Apply a function on the array. Example synthax: ak.sum(ARRAY,axis=1). No space allowed! "
+             "In streaming mode, the function is applied chunk by chunk.",
     )
     parser.add_argument(
         "-sv", "--sort_values",
@@ -103,94 +217,283 @@ if __name__ == "__main__":
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "-o", "--output",
+        help="Write the branches (filtered and created) to a .parquet, .arrow, .feather or .csv file "
+             "instead of printing them. In streaming mode, the file is written chunk by chunk.",
+    )
+    parser.add_argument(
+        "-s", "--step_size",
+        help="Streaming mode: read and print the data in chunks of this number of entries (e.g. 100000) "
+             "or of this size (e.g. \"100 MB\"), so that memory usage is bounded by the chunk size. "
+             "All branches must belong to the same TTree.",
+    )
+    parser.add_argument(
+        "-shard", "--shard",
+        help="Only read the files of shard i out of N, e.g. 0/10. Shards are balanced by file size.",
+    )
+    parser.add_argument(
+        "-nc", "--no_cache",
+        help="Do not use the on-disk cache of ROOT files metadata to find the number of entries of each file",
+        action="store_true",
+    )
 
+    return parser.parse_args()
 
-    ## Parse arguments
-    args = parser.parse_args()
 
-    ## Open ROOT file
-    data = uproot.open(args.file)
+def __get_step_size(step_size_text):
+    if step_size_text is None:
+        return None
+    elif step_size_text.strip().isdigit():
+        return int(step_size_text)
+    else:
+        return step_size_text
 
-    ## Read the branch data
-    # Get branch names
-    branch_names_to_dump = []
-    additional_branch_name = []
 
-    if args.branch:
-        branch_names_to_dump += args.branch.split(",")
+def __get_names_in_trees(branch_names):
+    """Group branch names given as tree_name/branch_name by TTree.
 
-    if args.create_branches:
-        pattern = "data\[[\"\']([0-9a-zA-Z_]+)[\"\']\]\.array\(\)"
-        additional_branch_name += re.findall(pattern, args.create_branches)
-        
-    branch_names_to_read = branch_names_to_dump + additional_branch_name
+    Returns:
+        dict[str, dict[str, str]]: Keys are TTree names, values map the branch
+            names to the names of the branches to read in the TTree
+    """
+
+    names_in_trees = {}
+    for branch_name in branch_names:
+        if "/" not in branch_name:
+            print("ERROR: Branch names must be given as tree_name/branch_name, got %s." % branch_name)
+            sys.exit(1)
+        tree_name, name_in_tree = branch_name.rsplit("/", 1)
+        names_in_trees.setdefault(tree_name, {})[branch_name] = name_in_tree.replace(".ref", "")
+
+    return names_in_trees
+
+
+def __get_branches_from_arrays(arrays, names_in_tree):
 
-    # Get branch data as an ak array
     branches = {}
-    for branch_name in branch_names_to_read:
+    for branch_name, name_in_tree in names_in_tree.items():
+        branch = arrays[name_in_tree]
         if branch_name.endswith(".ref"):
-            branch = data[branch_name.replace(".ref", "")].array().ref
-        else:
-            branch = data[branch_name].array()
+            branch = branch.ref
         branches[branch_name] = branch
 
+    return branches
+
+
+def __get_entry_range(args, file_names, branch_name):
+    """Translate --index into the range of entries to read in the files concatenated.
+
+    The number of entries of the files is only needed for negative indices and
+    steps, otherwise no file needs to be opened.
+
+    Returns:
+        tuple[int or None, int or None, int or slice or None]: entry_start,
+            entry_stop and index to apply on the entries read
+    """
+
+    if not args.index:
+        return None, None, None
+
+    event_indices = make_slice(args.index)
+
+    # The index applies on the filtered entries, all entries must be read
+    if args.filter:
+        return None, None, event_indices
+
+    if isinstance(event_indices, int) and event_indices >= 0:
+        return event_indices, event_indices+1, 0
+    if isinstance(event_indices, slice) and __is_non_negative(event_indices) and event_indices.stop is not None:
+        return event_indices.start, event_indices.stop, slice(None, None, event_indices.step)
+
+    tree_name = branch_name.rsplit("/", 1)[0]
+    num_entries = ioUtl.get_num_entries(file_names, tree_name, not args.no_cache)
+    return get_entry_range(event_indices, num_entries)
+
+
+def __read_branches(args, file_names, branch_names, entry_start=None, entry_stop=None):
+    """Read all entries of the branches in the entry range at once, with one read per TTree and file.
+
+    Only the files overlapping with the entry range are opened.
+    """
+
+    branches = {}
+    for tree_name, names_in_tree in __get_names_in_trees(branch_names).items():
+        arrays_per_file = []
+        entry_ranges = list(ioUtl.iterate_file_entry_ranges(file_names, tree_name, entry_start, entry_stop, not args.no_cache))
+        # Range after the last entry: read no entry
+        if len(entry_ranges) == 0:
+            entry_ranges = [ (file_names[0], 0, 0) ]
+        for file_name, local_entry_start, local_entry_stop in entry_ranges:
+            with uproot.open(file_name) as file_:
+                arrays_per_file.append(file_[tree_name].arrays(
+                    filter_name=sorted(set(names_in_tree.values())),
+                    entry_start=local_entry_start,
+                    entry_stop=local_entry_stop,
+                    how=dict,
+                ))
+
+        if len(arrays_per_file) == 1:
+            arrays = arrays_per_file[0]
+        else:
+            arrays = {
+                name: ak.concatenate([ x[name] for x in arrays_per_file ])
+                for name in set(names_in_tree.values())
+            }
+        branches.update(__get_branches_from_arrays(arrays, names_in_tree))
+
+    return branches
+
+
+def __iterate_branches(args, file_names, branch_names, step_size, entry_start=None, entry_stop=None):
+    """Yield dictionaries of branch arrays, chunk by chunk and file by file.
+
+    Files are only opened when the previous ones have been read.
+    """
+
+    names_in_trees = __get_names_in_trees(branch_names)
+    if len(names_in_trees) != 1:
+        print("ERROR: In streaming mode, all branches must belong to the same TTree, got %s." % ", ".join(sorted(names_in_trees)))
+        sys.exit(1)
+
+    tree_name, names_in_tree = names_in_trees.popitem()
+    entry_ranges = ioUtl.iterate_file_entry_ranges(file_names, tree_name, entry_start, entry_stop, not args.no_cache)
+    for file_name, local_entry_start, local_entry_stop in entry_ranges:
+        with uproot.open(file_name) as file_:
+            for arrays in file_[tree_name].iterate(
+                    filter_name=sorted(set(names_in_tree.values())),
+                    step_size=step_size,
+                    entry_start=local_entry_start,
+                    entry_stop=local_entry_stop,
+                    how=dict,
+                ):
+                yield __get_branches_from_arrays(arrays, names_in_tree)
+
+
+def __get_chunk_selection(index, offset, n_entries):
+    """Translate a selection of entries into a selection local to a chunk.
+
+    Args:
+        index (int or slice): Selection over all (filtered) entries, with
+            non-negative start and stop
+        offset (int): Number of (filtered) entries in the previous chunks
+        n_entries (int): Number of (filtered) entries in the chunk
+
+    Returns:
+        tuple[int or slice or None, bool]: Local selection (None if no entry
+            of the chunk is selected) and whether the selection is complete
+            after this chunk
+    """
+
+    if isinstance(index, int):
+        if offset <= index < offset + n_entries:
+            return index - offset, True
+        else:
+            return None, index < offset + n_entries
+
+    start = 0 if index.start is None else index.start
+    step = 1 if index.step is None else index.step
+    first = max(start, offset)
+    first += (start - first) % step
+    local_stop = n_entries if index.stop is None else min(index.stop - offset, n_entries)
+    done = index.stop is not None and index.stop <= offset + n_entries
+    if first - offset >= local_stop:
+        return None, done
+    else:
+        return slice(first - offset, local_stop, step), done
+
+
+def __is_non_negative(index):
+    if isinstance(index, int):
+        return index >= 0
+    return all(x is None or x >= 0 for x in (index.start, index.stop)) \
+        and (index.step is None or index.step > 0)
+
+
+def __make_branches(args, inputs, branch_names_to_read):
+    """Create branches on the fly and apply the filter.
+
+    Created branches can be used in the expressions of the next created
+    branches and in the filter.
+    """
+
+    inputs = dict(inputs)
+    namespace = {"data": _ChunkData(inputs), "ak": ak, "np": np}
+    branches = {branch_name: inputs[branch_name] for branch_name in branch_names_to_read}
+
     if args.create_branches:
        for branch_name_expression in args.create_branches.split(";"):
-           branch_name, expression = branch_name_expression.split(":")
-           branches[branch_name] = eval(expression)
-           branch_names_to_dump.append(branch_name)
+           branch_name, expression = branch_name_expression.split(":", 1)
+           branches[branch_name] = exprUtl.evaluate(expression, namespace)
+           inputs[branch_name] = branches[branch_name]
 
     # Filter the array
     if args.filter:
-        filter_text_for_printout = args.filter\
-            .replace("data[\"", "")\
-            .replace("[\"", "")\
-            .replace("\"]", "")\
-            .replace(".array()", "")
-        filter_text_for_printout = args.filter
-        filter_ = eval(args.filter)
-        filter_count = ak.count(filter_, axis=-1)
+        filter_ = exprUtl.evaluate(args.filter, namespace)
         for branch_name in branches.keys():
-            count = ak.count(branches[branch_name], axis=-1)
             branches[branch_name] = branches[branch_name][filter_]
 
-    if args.index:
-        event_indices = make_slice(args.index)
-    if args.jindex:
-        axis1_indices = make_slice(args.jindex)
+    return branches
 
-    # Cast to pandas dataframe
-    if args.pandas:
-        data_frame = ak.to_pandas(ak.Array(branches), how="outer")
-        if args.index:
-            data_frame = data_frame.loc(axis=0)[event_indices]
 
-        if args.sort_values:
-            data_frame.sort_values(
-                by=args.sort_values.split(","),
-                inplace=True,
-                ascending=not args.descending,
-            )
+def __select_entries(branches, event_indices):
+    """Select entries of the branches as a list of entries, also for a single entry.
 
-        with pd.option_context(
-            "display.max_rows", None,
-            "display.max_columns", None,
-            "display.precision", 5,
-            "display.expand_frame_repr", False,
-            ):
-            cols = {x: x.split("/")[-1] for x in data_frame.columns}
-            data_frame.rename(columns=cols, inplace=True)
-            print(data_frame.to_string(index=not args.no_index))
+    Returns:
+        tuple[dict, int, int]: Selected branches, and position of the first
+            selected entry and step between selected entries in the branches
+    """
 
-        exit(0)
+    n_entries = len(next(iter(branches.values())))
+    entries = range(n_entries)[event_indices]
+    if isinstance(entries, int):
+        event_indices = slice(entries, entries+1)
+        entries = range(entries, entries+1)
 
+    return { name: branch[event_indices] for name, branch in branches.items() }, entries.start, entries.step
 
-    branch_name = branch_names_to_dump[0]
-    branch = branches[branch_name]
 
-    # Get only selected leaves/events
-    if args.index:
-        branch = branch[event_indices]
+def __print_data_frame(args, data_frame, header=True, column_widths=None):
+    """Print a data frame, possibly as one chunk of a longer table.
+
+    Args:
+        header (bool, optional, default=True): Whether to print the column
+            names, False for the chunks after the first one
+        column_widths (dict or None, optional, default=None): Width of each
+            column, filled with the widths of the first non-empty chunk so
+            that the next chunks are aligned with it. Longer values in the
+            next chunks are printed in full
+    """
+
+    with pd.option_context(
+        "display.max_rows", None,
+        "display.max_columns", None,
+        "display.precision", 5,
+        "display.expand_frame_repr", False,
+        ):
+        cols = {x: x.split("/")[-1] for x in data_frame.columns}
+        data_frame.rename(columns=cols, inplace=True)
+        if column_widths is None:
+            print(data_frame.to_string(index=not args.no_index, header=header, index_names=header))
+            return
+
+        if len(data_frame) == 0:
+            return
+        if len(column_widths) == 0:
+            column_widths.update({
+                col: max(map(len, data_frame[[col]].to_string(index=False).splitlines()))
+                for col in data_frame.columns
+            })
+        # The column names are always rendered so that the index columns keep their width
+        lines = data_frame.to_string(index=not args.no_index, col_space=column_widths).splitlines()
+        if not header:
+            has_index_names = not args.no_index and any(name is not None for name in data_frame.index.names)
+            lines = lines[2 if has_index_names else 1:]
+        print("\n".join(lines))
+
+
+def __transform_branch(args, branch, axis1_indices):
+    """Apply --jindex, --flatten and --apply to the selected entries."""
 
     if args.jindex:
         if isinstance(axis1_indices, int):
@@ -202,61 +505,350 @@ if __name__ == "__main__":
 
     # Apply a function over the array
     if args.apply:
-        variable_name = args.apply.replace("ARRAY", args.branch)
-        branch = eval(args.apply.replace("ARRAY", "branch"))
+        branch = exprUtl.evaluate(args.apply.replace("ARRAY", "branch"), {"branch": branch, "ak": ak, "np": np})
 
-    # Cast into a list (useful for printing out the all leaves/events)
-    if args.list:
-        branch = ak.to_list(branch)
+    return branch
 
-    # Count unique values
-    if args.count:
-        counter = Counter(branch)
 
-    # Header line
+def __print_header(args):
+
     if not args.apply:
         print("Content of branch %s:" %(args.branch))
     elif args.count:
         print("Unique values and counts in branch %s:" %(args.branch))
     else:
+        variable_name = args.apply.replace("ARRAY", args.branch)
         print(variable_name)
 
     if args.filter:
-        print("with selection: %s" %filter_text_for_printout)
+        print("with selection: %s" %args.filter)
+
+
+def __count_values(counter, branch):
+    """Add the counts of the unique values of an array, flattened, to a counter."""
+
+    if isinstance(branch, ak.Array):
+        values = ak.to_numpy(ak.flatten(branch, axis=None))
+    else:
+        values = np.asarray(branch).ravel()
+
+    # Keys stay numpy scalars so that they are printed with their dtype, e.g. 0.1 for float32
+    unique_values, counts = np.unique(values, return_counts=True)
+    counter.update(dict(zip(unique_values, counts.tolist())))
+
+
+def __print_counter(args, counter):
+
+    if args.countFormat == "fraction":
+        unit = "%"
+        unit_factor = 100/max(sum(counter.values()), 1)
+        list_format = args.list_format if args.list_format else ".2f"
+    elif args.countFormat == "number":
+        unit = ""
+        unit_factor = 1
+        list_format = args.list_format if args.list_format else "d"
+
+    if args.top is None:
+        values = sorted(counter.keys())
+    else:
+        values = [ value for value, count in counter.most_common(args.top) ]
+
+    txt = "%s: %" + list_format + " %s"
+    for value in values:
+        count = counter[value]
+        count = count*unit_factor
+        print(txt % (value, count, unit))
+    total_count = sum(counter.values())*unit_factor
+    print("%s: %d %s" %("Total", total_count, unit))
+
+
+def __get_values_to_format(flat_values, value_format):
+    """Return the values of a numpy array as a list, to be formatted with value_format.
+
+    Floats of less than 64 bits are converted to str by numpy, so that they are
+    printed with their own precision, e.g. 0.1 for float32.
+    """
+
+    if value_format == "%s" and flat_values.dtype.kind == "f" and flat_values.dtype.itemsize < 8:
+        return flat_values.astype(str).tolist()
+    else:
+        return flat_values.tolist()
+
+
+def __format_entries(branch, list_format, first_entry=0):
+    """Format a flat or jagged numerical array as "entry\tvalue" lines, all at once.
+
+    A format string for the whole chunk is built from the row lengths, then
+    filled with the entry numbers and the flat content of the array in one
+    % operation, so that there is no Python loop over the entries.
+
+    Returns:
+        str or None: Formatted lines, None if the array is neither a flat nor a
+            jagged array of numbers
+    """
+
+    if not isinstance(branch, ak.Array) or branch.ndim > 2 or "string" in str(ak.type(branch)):
+        return None
+    try:
+        flat_values = ak.to_numpy(ak.flatten(branch, axis=None))
+    except Exception:
+        return None
+    if flat_values.dtype.kind not in "biuf":
+        return None
+
+    n_entries = len(branch)
+    entries = np.arange(first_entry, first_entry + n_entries)
+    if list_format:
+        value_format = "%" + list_format
+    else:
+        value_format = "%s"
+
+    # Flat array
+    if branch.ndim == 1:
+        values = np.empty(2*n_entries, dtype=object)
+        values[0::2] = entries.tolist()
+        values[1::2] = __get_values_to_format(flat_values, value_format)
+        return ("%d\t" + value_format + "\n") * n_entries % tuple(values.tolist())
+
+    # Jagged array
+    if not list_format and flat_values.dtype.kind == "f":
+        value_format = "%.3g"
+    counts = ak.to_numpy(ak.num(branch, axis=1))
+    starts = np.cumsum(counts) - counts
+    row_of_values = np.repeat(np.arange(n_entries), counts)
+    is_last = np.zeros(len(flat_values), dtype=bool)
+    is_last[(starts + counts - 1)[counts > 0]] = True
+
+    # Each row is "entry\t[" followed by its values, or "entry\t[]\n" if empty
+    entry_positions = starts + np.arange(n_entries)
+    value_positions = np.arange(len(flat_values)) + row_of_values + 1
+    formats = np.empty(n_entries + len(flat_values), dtype=object)
+    formats[entry_positions] = np.where(counts > 0, "%d\t[", "%d\t[]\n")
+    formats[value_positions] = np.where(is_last, value_format + "]\n", value_format + ", ")
+    values = np.empty(n_entries + len(flat_values), dtype=object)
+    values[entry_positions] = entries.tolist()
+    values[value_positions] = __get_values_to_format(flat_values, value_format)
+
+    return "".join(formats.tolist()) % tuple(values.tolist())
+
+
+def __print_branch(args, branch, first_entry=0):
+
+    if not args.number:
+        print(branch)
+        return
+
+    text = __format_entries(branch, args.list_format, first_entry)
+    if text is None:
+        lines = []
+        for idx, x in enumerate(branch, first_entry):
+            if args.list_format:
+                s = "%" + args.list_format
+                x_str = "[" + ", ".join(s %(y) for y in x) + "]"
+            else:
+               x_str = x
+            lines.append("%d\t%s\n" %(idx, x_str))
+        text = "".join(lines)
+
+    # One write per chunk
+    sys.stdout.write(text)
+
+
+def __dump(args, file_names, branch_names_to_dump, branch_names_to_read, branch_names_to_eval):
+    """Read all the data at once and print it."""
+
+    entry_start, entry_stop, event_indices = __get_entry_range(args, file_names, branch_names_to_eval[0])
+    inputs = __read_branches(args, file_names, branch_names_to_eval, entry_start, entry_stop)
+    branches = __make_branches(args, inputs, branch_names_to_read)
+
+    if args.jindex:
+        axis1_indices = make_slice(args.jindex)
+    else:
+        axis1_indices = None
+
+    # Write to file
+    if args.output:
+        writer = _TableWriter(args.output)
+        if isinstance(event_indices, int):
+            event_indices = slice(event_indices, event_indices+1)
+        writer.write({
+            name: branches[name] if event_indices is None else branches[name][event_indices]
+            for name in branch_names_to_dump
+        })
+        writer.close()
+        return
+
+    # Cast to pandas dataframe
+    if args.pandas:
+        # Entries are selected by position before the conversion, as for the
+        # other outputs, then numbered as in the whole (filtered) dataset
+        first_entry, step = 0, 1
+        if event_indices is not None:
+            branches, first_entry, step = __select_entries(branches, event_indices)
+        data_frame = _to_data_frame(ak.Array(branches), how="outer")
+        _shift_index(data_frame, (entry_start or 0) + first_entry, step)
+
+        if args.sort_values:
+            data_frame.sort_values(
+                by=args.sort_values.split(","),
+                inplace=True,
+                ascending=not args.descending,
+            )
+
+        __print_data_frame(args, data_frame)
+        return
+
+    branch_name = branch_names_to_dump[0]
+    branch = branches[branch_name]
+
+    # Get only selected leaves/events
+    if event_indices is not None:
+        branch = branch[event_indices]
+
+    branch = __transform_branch(args, branch, axis1_indices)
+
+    # Cast into a list (useful for printing out the all leaves/events)
+    if args.list and not args.count:
+        branch = ak.to_list(branch)
+
+    __print_header(args)
 
     # Print asked information
     if args.count:
-        total_count = 0
-        if args.countFormat == "fraction":
-            unit = "%"
-            unit_factor = 100/sum(counter.values())
-        elif args.countFormat == "number":
-            unit = ""
-            unit_factor = 1
-        for value in sorted(counter.keys()):
-            count = counter[value]
-            count = count*unit_factor
-            txt = "%s: %" + args.list_format + " %s"
-            print(txt % (value, count, unit))
-            total_count += count
-        print("%s: %d %s" %("Total", total_count, unit))
-    
+        counter = Counter()
+        __count_values(counter, branch)
+        __print_counter(args, counter)
     else:
-        if not args.number:
-            print(branch)
-        else:
+        if args.number:
+            print("Entry\tValue")
+        __print_branch(args, branch)
+
+
+def __dump_streaming(args, file_names, branch_names_to_dump, branch_names_to_read, branch_names_to_eval):
+    """Read, process and print the data chunk by chunk."""
+
+    if args.pandas and args.sort_values:
+        print("ERROR: --sort_values cannot be used in streaming mode.")
+        sys.exit(1)
+
+    entry_start, entry_stop, event_indices = __get_entry_range(args, file_names, branch_names_to_eval[0])
+    axis1_indices = make_slice(args.jindex) if args.jindex else None
+
+    if event_indices is not None and not __is_non_negative(event_indices):
+        print("ERROR: Negative indices with --filter and negative steps cannot be used in streaming mode.")
+        sys.exit(1)
+
+    if not args.pandas and not args.output:
+        __print_header(args)
+        if args.number and not args.count:
             print("Entry\tValue")
-            for idx, x in enumerate(branch):
-                if args.list_format:
-                    if len(x) == 0:
-                        x_str = "[]"
-                    else:
-                        x_str = "["
-                        for y in x:
-                            s = "%" + args.list_format
-                            x_str += s %(y) + ", "
-                        x_str = x_str[:-2] + "]"
+
+    writer = _TableWriter(args.output) if args.output else None
+    counter = Counter()
+    n_entries_seen = 0
+    n_entries_printed = 0
+    column_widths = {}
+    step_size = __get_step_size(args.step_size)
+    for inputs in __iterate_branches(args, file_names, branch_names_to_eval, step_size, entry_start, entry_stop):
+        branches = __make_branches(args, inputs, branch_names_to_read)
+        n_entries = len(next(iter(branches.values())))
+
+        # Get only selected leaves/events
+        done = False
+        first_entry, step = 0, 1
+        if event_indices is not None:
+            local_indices, done = __get_chunk_selection(event_indices, n_entries_seen, n_entries)
+            if local_indices is None:
+                branches = None
+            elif args.output or args.pandas:
+                branches, first_entry, step = __select_entries(branches, local_indices)
+            else:
+                branches = {name: branch[local_indices] for name, branch in branches.items()}
+        # Number of the first entry of the chunk in the dataset
+        chunk_entry_start = (entry_start or 0) + n_entries_seen
+        n_entries_seen += n_entries
+
+        if branches is not None:
+            if writer is not None:
+                writer.write({ name: branches[name] for name in branch_names_to_dump })
+            elif args.pandas:
+                data_frame = _to_data_frame(ak.Array(branches), how="outer")
+                # Entry numbers of the whole dataset, as in the one-shot mode
+                _shift_index(data_frame, chunk_entry_start + first_entry, step)
+                __print_data_frame(args, data_frame, header=len(column_widths) == 0, column_widths=column_widths)
+            else:
+                branch = __transform_branch(args, branches[branch_names_to_dump[0]], axis1_indices)
+                if args.count:
+                    __count_values(counter, branch)
                 else:
-                   x_str = x
-                print("%d\t%s" %(idx, x_str))
+                    if args.list:
+                        branch = ak.to_list(branch)
+                    __print_branch(args, branch, n_entries_printed)
+                    n_entries_printed += len(branch) if isinstance(branch, (list, ak.Array)) else 1
 
+        # Stop reading once all requested entries were printed out
+        if done:
+            break
+
+    if writer is not None:
+        writer.close()
+    elif args.count:
+        __print_counter(args, counter)
+
+
+def main():
+    """Print out the content of branches of ROOT files.
+
+    Example:
+    $ rdump -f QCD_Pt_3200toInf_TuneCP5_13TeV_pythia8.root -b Events/FatJet_tau1 -l -i :10
+    will print the FatJet _au1 variable for the first 10 events of file QCD_Pt_3200toInf_TuneCP5_13TeV_pythia8.root
+    $ rdump -f QCD_Pt_3200toInf_TuneCP5_13TeV_pythia8.root -b Events/FatJet_tau1 -n -s 100000
+    will print the FatJet_tau1 variable for all events, reading 100000 events at a time
+    $ rdump -f list.txt -b Events/FatJet_tau1 -l -i 1000000:1000010
+    will print the FatJet_tau1 variable for 10 events of the files in list.txt, read as one dataset
+    """
+
+    args = __get_arguments()
+
+    ## Get ROOT files, read as one dataset
+    file_names = make_file_list(args.file, args.shard)
+    if len(file_names) == 0:
+        print("ERROR: No file found for %s!" % args.file)
+        sys.exit(1)
+
+    ## Get branch names
+    branch_names_to_dump = []
+    additional_branch_name = []
+
+    if args.branch:
+        branch_names_to_dump += args.branch.split(",")
+
+    # Branches used in the expressions are found by parsing them
+    created_branch_names = []
+    if args.create_branches:
+        for branch_name_expression in args.create_branches.split(";"):
+            branch_name, expression = branch_name_expression.split(":", 1)
+            additional_branch_name += [ x for x in exprUtl.get_dependencies(expression) if x not in created_branch_names ]
+            created_branch_names.append(branch_name)
+
+    branch_names_to_read = list(dict.fromkeys(branch_names_to_dump + additional_branch_name))
+
+    # Branches needed to evaluate the filter are read but not dumped
+    branch_names_to_eval = list(branch_names_to_read)
+    if args.filter:
+        branch_names_to_eval += [ x for x in exprUtl.get_dependencies(args.filter) if x not in created_branch_names ]
+    branch_names_to_eval = list(dict.fromkeys(branch_names_to_eval))
+
+    branch_names_to_dump += created_branch_names
+
+    ## Read and print the branch data
+    if args.step_size:
+        __dump_streaming(args, file_names, branch_names_to_dump, branch_names_to_read, branch_names_to_eval)
+    else:
+        __dump(args, file_names, branch_names_to_dump, branch_names_to_read, branch_names_to_eval)
+
+
+if __name__ == "__main__":
+    # Exit quietly when the output is piped to a command that stops reading, e.g. head
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy
+import ROOT
+
+import roothist
+
+fill_histogram = getattr(roothist, "__fill_histogram")
+
+
+def __get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", "--n_entries",
+        help="Number of entries to fill. Default=%(default)s",
+        type=int,
+        default=10**7,
+        )
+    parser.add_argument(
+        "-w", "--weighted",
+        help="Fill with random weights",
+        action="store_true",
+        )
+
+    return parser.parse_args()
+
+
+def main():
+    """Compare the time to fill a TH1D entry by entry and with numpy.
+
+    Example:
+    $ PYTHONPATH=/path/to/utilities python /path/to/utilities/roothist/benchmarkFill.py -n 10000000
+    """
+
+    args = __get_arguments()
+
+    rng = numpy.random.default_rng(seed=1)
+    values = rng.normal(size=args.n_entries)
+    weights = rng.uniform(0, 2, size=args.n_entries) if args.weighted else None
+
+    histogram_loop = ROOT.TH1D("loop", "", 50, -3, 3)
+    start = time.time()
+    if weights is None:
+        for x in values: histogram_loop.Fill(x)
+    else:
+        for x, w in zip(values, weights): histogram_loop.Fill(x, w)
+    time_loop = time.time() - start
+
+    histogram_numpy = ROOT.TH1D("numpy", "", 50, -3, 3)
+    start = time.time()
+    fill_histogram(histogram_numpy, values, weights)
+    time_numpy = time.time() - start
+
+    identical = all(
+        abs(histogram_loop.GetBinContent(ibin) - histogram_numpy.GetBinContent(ibin)) < 1e-6 * max(1, abs(histogram_loop.GetBinContent(ibin)))
+        and abs(histogram_loop.GetBinError(ibin) - histogram_numpy.GetBinError(ibin)) < 1e-6 * max(1, histogram_loop.GetBinError(ibin))
+        for ibin in range(histogram_loop.GetNbinsX()+2)
+    )
+
+    print("Entries:              %d" % args.n_entries)
+    print("TH1D.Fill loop:       %.2f s" % time_loop)
+    print("numpy fill:           %.2f s" % time_numpy)
+    print("Speed-up:             %.0f" % (time_loop / time_numpy))
+    print("Identical histograms: %s" % identical)
+    print("Mean (loop, numpy):   %.6f, %.6f" % (histogram_loop.GetMean(), histogram_numpy.GetMean()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,85 @@
 import argparse
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import uproot
 import numpy
 import awkward as ak
 import matplotlib.pyplot as plt
 import ROOT
 
-from helpers.generalUtilities import make_slice
+from helpers import IOUtilities as ioUtl
+from helpers.generalUtilities import make_slice, make_file_list, get_entry_range
 
 ROOT.gROOT.SetBatch()
 
 colors = [ROOT.kRed, ROOT.kBlue, ROOT.kGreen, ROOT.kBlack, ROOT.kGray+1]
 line_styles = [1, 9, 7, 2, 3]
 
+# Maximum size in bytes of the on-disk cache of filled chunks, least recently used results are evicted first
+cache_max_size = 200 * 10**6
+
+
+class _CachedChunk:
+    """Range of entries of one or several ROOT files read as one dataset, whose branches are read only once.
+
+    data["branch_name"].array() in filter expressions also uses the cache.
+    Files stay open in each process for the next chunks.
+    """
+
+    opened_files = {}
+    max_opened_files = 8
+
+    def __init__(self, file_names, entry_start=None, entry_stop=None):
+        self.__file_names = file_names
+        self.__entry_start = entry_start
+        self.__entry_stop = entry_stop
+        self.__arrays = {}
+
+    def __getitem__(self, branch_name):
+        return _CachedBranch(self, branch_name)
+
+    def __open(self, file_name):
+        opened_files = _CachedChunk.opened_files
+        if file_name not in opened_files:
+            if len(opened_files) >= _CachedChunk.max_opened_files:
+                opened_files.pop(next(iter(opened_files))).close()
+            opened_files[file_name] = uproot.open(file_name)
+        return opened_files[file_name]
+
+    def get_branch(self, branch_name):
+        return self.__open(self.__file_names[0])[branch_name]
+
+    def get_array(self, branch_name):
+        if branch_name not in self.__arrays:
+            arrays = [
+                self.__open(file_name)[branch_name].array(entry_start=self.__entry_start, entry_stop=self.__entry_stop)
+                for file_name in self.__file_names
+            ]
+            self.__arrays[branch_name] = arrays[0] if len(arrays) == 1 else ak.concatenate(arrays)
+        return self.__arrays[branch_name]
+
+
+class _CachedBranch:
+
+    def __init__(self, chunk, branch_name):
+        self.__chunk = chunk
+        self.__branch_name = branch_name
+
+    def array(self):
+        return self.__chunk.get_array(self.__branch_name)
+
+    def __getattr__(self, name):
+        return getattr(self.__chunk.get_branch(self.__branch_name), name)
+
 
 def __get_arguments():
     parser = argparse.ArgumentParser()
@@ -28,7 +95,9 @@ def __get_arguments():
         )
     parser.add_argument(
         "-f", "--file",
-        help="File for which to make histogram (for multiple histograms from different files, separate files by a comma ',')",
+        help="Files for which to make histogram: comma separated ROOT files, file name expansion or txt file with "
+             "a ROOT file on each line, several syntaxes can be combined with '+' "
+             "(for multiple histograms from different files, separate files by a comma ',', one per histogram)",
         required=True,
         )
     parser.add_argument(
@@ -49,6 +118,47 @@ def __get_arguments():
         "-filter", "--filter",
         help="Filter the array using the specified array. Example synthax: data.[\"branch_name\"]==1. No space allowed!",
         )
+    parser.add_argument(
+        "-w", "--weight",
+        help="Branch with the weights to fill the histogram with (for multiple histograms, separate branches by a comma ',', None for no weight)",
+        )
+    parser.add_argument(
+        "-jobs", "--jobs",
+        help="Number of processes filling the histograms in parallel. "
+             "The values kept in memory for the automatic range, see --keep_memory, are sent back by the processes. "
+             "Default=%(default)s",
+        type=int,
+        default=1,
+        )
+    parser.add_argument(
+        "-s", "--step_size",
+        help="Number of entries per chunk, by default one chunk per file. Each chunk is filled independently. "
+             "Each chunk gets an equal share of --keep_memory.",
+        type=int,
+        )
+    parser.add_argument(
+        "-km", "--keep_memory",
+        help="Memory in MB used to keep the values read to compute the automatic range, "
+             "so that the histograms are filled without reading the chunks again. "
+             "The memory is shared equally between chunks, chunks whose values do not fit are read twice. "
+             "0 to always read twice. Default=%(default)s",
+        type=int,
+        default=200,
+        )
+    parser.add_argument(
+        "-shard", "--shard",
+        help="Only read the files of shard i out of N, e.g. 0/10. Shards are balanced by file size.",
+        )
+    parser.add_argument(
+        "-nc", "--no_cache",
+        help="Do not use the on-disk cache of filled histograms",
+        action="store_true",
+        )
+    parser.add_argument(
+        "-rc", "--refresh_cache",
+        help="Fill the histograms again and update the on-disk cache",
+        action="store_true",
+        )
     parser.add_argument(
         "-n", "--nbins",
         help="Number of bins",
@@ -61,6 +171,11 @@ def __get_arguments():
         "-max", "--max",
         help="Maximum",
         )
+    parser.add_argument(
+        "-q", "--quantile_range",
+        help="Without --min/--max, comma-separated lower and upper percentiles used as histogram range, e.g. 0.1,99.9 "
+             "(approximated from a bounded sample of the values)",
+        )
     parser.add_argument(
         "-norm1", "--normalize_to_1",
         help="Normalize to unit area",
@@ -161,58 +276,535 @@ def __setup_style():
     ROOT.TGaxis.SetExponentOffset(-0.08, 0.01, "Y")
 
 
-def __get_binning(args, branch):
+def __get_range_summary(args, values, max_sample_size=1000000):
+    """Return the number, minimum and maximum of the non-NaN values of a chunk, and a sample of them for quantiles.
+
+    The sample is a random subset of at most max_sample_size values in
+    random order, so that any prefix of it is also a uniform sample.
+    """
+
+    values = values[~numpy.isnan(values)]
+    summary = {
+        "n_values": len(values),
+        "min": values.min() if len(values) > 0 else None,
+        "max": values.max() if len(values) > 0 else None,
+        "sample": None,
+    }
+    if args.quantile_range:
+        rng = numpy.random.default_rng(seed=0)
+        summary["sample"] = values[rng.permutation(len(values))[:max_sample_size]]
+
+    return summary
+
+
+def __get_approximate_quantiles(summaries, quantiles, max_sample_size=1000000):
+    """Return approximate quantiles of the values of several chunks.
+
+    The quantiles are computed on a uniform sample of at most max_sample_size
+    values drawn from all chunks, each chunk contributing in proportion to its
+    number of values, so that memory and time do not grow with the number of
+    values.
+    """
+
+    n_values = sum(summary["n_values"] for summary in summaries)
+    fraction = min(1., max_sample_size / n_values)
+    sample = [ summary["sample"][:int(round(fraction * summary["n_values"]))] for summary in summaries ]
+
+    return numpy.quantile(numpy.concatenate(sample), quantiles)
+
+
+def __get_binning(args, summaries):
+    """Return the binning shared by all histograms.
+
+    Args:
+        args (argparse.Namespace)
+        summaries (list[dict]): Range summaries of all chunks of all histograms,
+            see __get_range_summary
+
+    Returns:
+        tuple[int, float, float]: Number of bins, minimum and maximum
+    """
+
     if args.nbins:
         n_bins = int(args.nbins)
     else:
         n_bins = 50
 
+    if args.min and args.max:
+        return n_bins, float(args.min), float(args.max)
+
+    summaries = [ summary for summary in summaries if summary["n_values"] > 0 ]
+    if len(summaries) == 0:
+        low, high = 0., 1.
+    elif args.quantile_range:
+        percentiles = [ float(x) for x in args.quantile_range.split(",") ]
+        low, high = __get_approximate_quantiles(summaries, [ x/100 for x in percentiles ])
+    else:
+        low = min(summary["min"] for summary in summaries)
+        high = max(summary["max"] for summary in summaries)
+        low, high = 0.9*low, 1.1*high
+
     if args.min:
         min_ = float(args.min)
     else:
-        min_ = 0.9*min(branch)
+        min_ = low
 
     if args.max:
         max_ = float(args.max)
     else:
-        max_ = 1.1*max(branch)
+        max_ = high
 
     return n_bins, min_, max_
 
 
-def __get_histogram_from_array(args, file_name, branch_name, filter_expression, binning=None):
+def __get_bin_sums(values, weights, n_bins, x_min, x_max):
+    """Return the sums of weights and squared weights in each bin, with the statistics TH1D.Fill would accumulate.
+
+    Bins are found as in TAxis::FindBin: underflow bin 0, overflow (and NaN)
+    bin n_bins+1. Bin sums of several chunks can be merged by summing them.
+
+    Returns:
+        dict: "sumw" and "sumw2" arrays of n_bins+2 bins, "stats" array of
+            sum of w, w^2, w*x and w*x^2 for values in the axis range, and
+            "n_entries"
+    """
+
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if weights is None:
+        weights = numpy.ones_like(values)
+    else:
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+
+    bins = numpy.full(values.shape, n_bins+1, dtype=numpy.int64)
+    bins[values < x_min] = 0
+    in_range = (values >= x_min) & (values < x_max)
+    bins[in_range] = 1 + (n_bins * (values[in_range] - x_min) / (x_max - x_min)).astype(numpy.int64)
+
+    # Statistics are only accumulated for values in the axis range
+    x = values[in_range]
+    w = weights[in_range]
+
+    return {
+        "sumw": numpy.bincount(bins, weights=weights, minlength=n_bins+2),
+        "sumw2": numpy.bincount(bins, weights=weights**2, minlength=n_bins+2),
+        "stats": numpy.array([w.sum(), (w**2).sum(), (w*x).sum(), (w*x**2).sum()], dtype=numpy.float64),
+        "n_entries": len(values),
+    }
+
+
+def __merge_bin_sums(bin_sums_list, n_bins):
+    """Sum the bin sums of several chunks, in order."""
+
+    merged = {
+        "sumw": numpy.zeros(n_bins+2),
+        "sumw2": numpy.zeros(n_bins+2),
+        "stats": numpy.zeros(4),
+        "n_entries": 0,
+    }
+    for bin_sums in bin_sums_list:
+        for key in merged:
+            merged[key] = merged[key] + bin_sums[key]
+
+    return merged
+
 
-    ## Open ROOT file
-    data = uproot.open(file_name)
+def __set_bin_sums(histogram, bin_sums):
+    """Copy bin sums into a TH1D, together with its statistics."""
+
+    sumw = bin_sums["sumw"]
+    sumw2 = bin_sums["sumw2"]
+
+    if not numpy.array_equal(sumw, sumw2):
+        histogram.Sumw2()
+    for ibin in range(len(sumw)):
+        histogram.SetBinContent(ibin, sumw[ibin])
+        if histogram.GetSumw2N() > 0:
+            histogram.SetBinError(ibin, numpy.sqrt(sumw2[ibin]))
+
+    histogram.PutStats(numpy.array(bin_sums["stats"], dtype=numpy.float64))
+    histogram.SetEntries(bin_sums["n_entries"])
+
+
+def __fill_histogram(histogram, values, weights=None):
+    """Fill a TH1D with all values at once.
+
+    Bin contents, including underflow and overflow, are computed with numpy
+    using the same bin finding as TH1D.Fill, then copied into the histogram
+    together with the statistics that TH1D.Fill would have accumulated.
+    """
+
+    axis = histogram.GetXaxis()
+    bin_sums = __get_bin_sums(values, weights, axis.GetNbins(), axis.GetXmin(), axis.GetXmax())
+    __set_bin_sums(histogram, bin_sums)
+
+
+def __get_array(args, data, branch_name, filter_expression, weight_name=None, event_indices=None):
+    """Return the flat numpy arrays of values and weights (None if no weight) to histogram.
+
+    Args:
+        data (_CachedChunk)
+        event_indices (int, slice or None): Index applied to the entries of
+            the chunk, after the filter
+    """
 
-    ## Read the branch data
     # Get branch data as an ak array
-    branch = data[branch_name].array()
+    branch = data.get_array(branch_name)
+    # Event weights are applied to all the values of the event
+    if weight_name is not None:
+        weight = ak.broadcast_arrays(data.get_array(weight_name), branch)[0]
 
-    if args.filter:
-        if filter_expression is not None:
-            filter_ = eval(filter_expression)
-            branch = branch[filter_]
+    if args.filter and filter_expression is not None:
+        filter_ = eval(filter_expression)
+        branch = branch[filter_]
+        if weight_name is not None:
+            weight = weight[filter_]
 
     # Get only selected leaves/events
-    if args.index:
-        branch = branch[make_slice(args.index)]
+    if event_indices is not None:
+        branch = branch[event_indices]
+        if weight_name is not None:
+            weight = weight[event_indices]
 
     if args.jindex:
-        branch = branch[ak.num(branch, axis=1)>args.jindex]
+        mask = ak.num(branch, axis=1)>args.jindex
+        branch = branch[mask]
         branch = branch[:, args.jindex]
+        if weight_name is not None:
+            weight = weight[mask][:, args.jindex]
+
+    if weight_name is not None:
+        weight = ak.to_numpy(ak.flatten(weight, axis=None))
+    else:
+        weight = None
+    branch = ak.to_numpy(ak.flatten(branch, axis=None))
+
+    return branch, weight
+
+
+def __get_chunks(args, file_names, branch_name, has_filter):
+    """Split the entries to histogram into chunks which can be filled independently.
+
+    Returns:
+        list[tuple]: File names, entry start, entry stop and index to apply
+            on the entries read, for each chunk
+    """
+
+    # The index applies to the filtered entries, so all entries are read as one chunk
+    if args.index and has_filter:
+        return [ (tuple(file_names), None, None, make_slice(args.index)) ]
+
+    tree_name = branch_name.rsplit("/", 1)[0]
+
+    # Without filter, only read the entries selected by the index
+    if args.index:
+        num_entries = ioUtl.get_num_entries(file_names, tree_name)
+        entry_start, entry_stop, local_index = get_entry_range(make_slice(args.index), num_entries)
+        ranges = ioUtl.iterate_file_entry_ranges(file_names, tree_name, entry_start, entry_stop)
+        if isinstance(local_index, int):
+            return [ ((file_name,), start, stop, local_index) for file_name, start, stop in ranges ]
+
+        # Selected entries are every step-th entry from the first entry of
+        # the range for positive steps, from the last one for negative steps
+        step = abs(local_index.step)
+        anchor = entry_start if local_index.step > 0 else entry_stop-1
+        chunks = []
+        global_start = entry_start
+        for file_name, start, stop in ranges:
+            first = global_start + (anchor - global_start) % step
+            chunks.append(((file_name,), start, stop, slice(first - global_start, None, step)))
+            global_start += stop - start
+        return chunks
+
+    if args.step_size is None:
+        return [ ((file_name,), None, None, None) for file_name in file_names ]
+
+    chunks = []
+    for file_name in file_names:
+        num_entries = ioUtl.get_num_entries([file_name], tree_name)
+        for start in range(0, num_entries, args.step_size):
+            chunks.append(((file_name,), start, min(start + args.step_size, num_entries), None))
+    return chunks
+
+
+def __process_chunk(task):
+    """Compute the range summary or the bin sums of histograms on one chunk of entries.
+
+    Run in the worker processes, ROOT histograms are only made in the main process.
+
+    Args:
+        task (tuple): args, file names, entry start, entry stop, index to
+            apply on the entries, histograms as list of (histogram index,
+            branch name, filter expression, weight name), binning (None
+            to compute the range summaries) and maximum number of bytes of
+            values to keep
+
+    Returns:
+        dict[int, dict]: Range summary or bin sums of each histogram. Range
+            summaries also have the values and weights read as "kept_values"
+            if they fit in the maximum number of bytes, so that the histograms
+            can be filled without reading the chunk again.
+    """
+
+    args, file_names, entry_start, entry_stop, event_indices, histograms, binning, max_kept_bytes = task
+
+    data = _CachedChunk(file_names, entry_start, entry_stop)
+    results = {}
+    n_kept_bytes = 0
+    for ihist, branch_name, filter_expression, weight_name in histograms:
+        values, weights = __get_array(args, data, branch_name, filter_expression, weight_name, event_indices)
+        if binning is None:
+            results[ihist] = __get_range_summary(args, values)
+            n_bytes = values.nbytes + (weights.nbytes if weights is not None else 0)
+            if n_kept_bytes + n_bytes <= max_kept_bytes:
+                results[ihist]["kept_values"] = (values, weights)
+                n_kept_bytes += n_bytes
+        else:
+            results[ihist] = __get_bin_sums(values, weights, *binning)
+
+    return results
+
+
+@functools.lru_cache(maxsize=None)
+def __get_file_identity(file_name):
+    """Return the path, size and modification time of a file, or None if unknown."""
+
+    identity = ioUtl.get_file_identity(file_name)
+    if identity is None:
+        return None
+    if not ioUtl.has_redirector(file_name):
+        file_name = os.path.realpath(file_name)
+    return (file_name,) + tuple(identity)
+
+
+def __get_cache_key(args, chunk, histogram, binning):
+    """Return the key of the result of one histogram on one chunk in the cache, None if it cannot be cached.
+
+    Range summaries with a sample of the values for --quantile_range are not
+    cached.
+
+    The key is a hash of everything the result depends on: identity of the
+    files, entries read, index, branch, filter, weight, jindex, and binning
+    or range settings.
+    """
 
-    branch = ak.flatten(branch, axis=None)
+    file_names, entry_start, entry_stop, event_indices = chunk
+    ihist, branch_name, filter_expression, weight_name = histogram
 
-    # Binning
+    # Samples of values for the quantiles are too large to be cached
+    if binning is None and args.quantile_range:
+        return None
+
+    file_identities = [ __get_file_identity(file_name) for file_name in file_names ]
+    if None in file_identities:
+        return None
+
+    description = {
+        "version": 1,
+        "files": file_identities,
+        "entry_start": entry_start,
+        "entry_stop": entry_stop,
+        "index": str(event_indices),
+        "branch": branch_name,
+        "filter": filter_expression,
+        "weight": weight_name,
+        "jindex": args.jindex,
+    }
     if binning is None:
-        n_bins, min_, max_ = __get_binning(args, branch)
+        description["range"] = {"sample": False}
+    else:
+        description["binning"] = [ repr(x) for x in binning ]
+
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def __connect_cache():
+
+    Path(ioUtl.get_cache_directory()).mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(ioUtl.get_cache_directory(), "roothist.sqlite"), timeout=60)
+    # Pages of evicted results are given back to the file system
+    connection.execute("PRAGMA auto_vacuum = FULL")
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, result BLOB, size INTEGER, last_used REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        # Results of previous versions had no size and could hold large samples of values
+        has_old_table = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='chunk_results'"
+        ).fetchone() is not None
+        if has_old_table:
+            connection.execute("DROP TABLE chunk_results")
+    if has_old_table:
+        connection.execute("VACUUM")
+    return connection
+
+
+def __read_cache(keys):
+    """Return the cached results of the given keys which are in cache, and mark them as used."""
+
+    connection = __connect_cache()
+    try:
+        cached_results = {}
+        keys = list(keys)
+        # Stay below the maximum number of SQL variables
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i+500]
+            rows = connection.execute(
+                "SELECT key, result FROM results WHERE key IN (%s)" % ",".join("?" for key in batch),
+                batch,
+            )
+            for key, result in rows:
+                cached_results[key] = pickle.loads(result)
+        with connection:
+            now = time.time()
+            connection.executemany(
+                "UPDATE results SET last_used=? WHERE key=?",
+                [ (now, key) for key in cached_results ],
+            )
+    finally:
+        connection.close()
+
+    return cached_results
+
+
+def __write_cache(results, max_size=None):
+    """Write results given as a dictionary of keys and results to cache.
+
+    Least recently used results are then evicted until the cache is smaller
+    than max_size bytes (cache_max_size by default).
+    """
+
+    if max_size is None:
+        max_size = cache_max_size
+
+    connection = __connect_cache()
+    try:
+        with connection:
+            now = time.time()
+            rows = []
+            for key, result in results.items():
+                blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+                rows.append((key, blob, len(blob), now))
+            connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total_size > max_size:
+                keys_to_evict = []
+                for key, size in connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+                    if total_size <= max_size:
+                        break
+                    keys_to_evict.append((key,))
+                    total_size -= size
+                connection.executemany("DELETE FROM results WHERE key=?", keys_to_evict)
+    finally:
+        connection.close()
+
+
+def __process_chunks(args, chunks, binning, kept_values=None):
+    """Process all chunks, in parallel with --jobs, and return the results in the order of the chunks.
+
+    The result of each histogram on each chunk is cached on disk, so that
+    only the chunks of new or modified files, or with new settings, are read.
+    The cache is bounded by cache_max_size.
+
+    To compute the range (binning None), the values read are kept in memory,
+    up to --keep_memory in total shared equally between chunks, so that the
+    histograms are then filled without reading the chunks again.
+
+    Args:
+        args (argparse.Namespace)
+        chunks (list[tuple]): Chunk and its histograms, see __process_chunk
+        binning (tuple or None): See __process_chunk
+        kept_values (list[dict] or None, optional, default=None): With a
+            binning, values and weights kept in memory for each histogram of
+            each chunk, see __pop_kept_values
+
+    Returns:
+        list[dict[int, dict]]
+    """
+
+    results = [ {} for chunk in chunks ]
+
+    # Look up cached results
+    keys = [ {} for chunk in chunks ]
+    if not args.no_cache:
+        for ichunk, (chunk, histograms) in enumerate(chunks):
+            for histogram in histograms:
+                key = __get_cache_key(args, chunk, histogram, binning)
+                if key is not None:
+                    keys[ichunk][histogram[0]] = key
+        if not args.refresh_cache:
+            cached_results = __read_cache(key for chunk_keys in keys for key in chunk_keys.values())
+            for ichunk, chunk_keys in enumerate(keys):
+                for ihist, key in chunk_keys.items():
+                    if key in cached_results:
+                        results[ichunk][ihist] = cached_results[key]
+
+    # Fill from the values kept in memory
+    results_to_cache = {}
+    if kept_values is not None:
+        for ichunk, chunk_values in enumerate(kept_values):
+            for ihist, (values, weights) in chunk_values.items():
+                if ihist not in results[ichunk]:
+                    results[ichunk][ihist] = __get_bin_sums(values, weights, *binning)
+                    if ihist in keys[ichunk]:
+                        results_to_cache[keys[ichunk][ihist]] = results[ichunk][ihist]
+
+    # Only process the histograms of each chunk which are not in cache
+    chunks_to_process = []
+    for ichunk, (chunk, histograms) in enumerate(chunks):
+        histograms = [ histogram for histogram in histograms if histogram[0] not in results[ichunk] ]
+        if len(histograms) > 0:
+            chunks_to_process.append((ichunk, chunk, histograms))
+    # Each chunk gets the same share of memory, so that workers do not send back values which cannot be kept
+    max_kept_bytes = args.keep_memory * 10**6 // max(len(chunks_to_process), 1) if binning is None else 0
+    tasks = [ (args,) + chunk + (histograms, binning, max_kept_bytes) for ichunk, chunk, histograms in chunks_to_process ]
+    task_chunk_indices = [ ichunk for ichunk, chunk, histograms in chunks_to_process ]
+
+    if args.jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for ichunk, chunk_results in zip(task_chunk_indices, executor.map(__process_chunk, tasks)):
+                __store_results(results, results_to_cache, keys, ichunk, chunk_results)
     else:
-        n_bins, min_, max_ = binning
+        for ichunk, task in zip(task_chunk_indices, tasks):
+            __store_results(results, results_to_cache, keys, ichunk, __process_chunk(task))
+
+    if len(results_to_cache) > 0:
+        __write_cache(results_to_cache)
+
+    return results
+
+
+def __store_results(results, results_to_cache, keys, ichunk, chunk_results):
+    """Store the results of one chunk, without the values kept in memory in the results to cache."""
+
+    for ihist, result in chunk_results.items():
+        results[ichunk][ihist] = result
+        if ihist in keys[ichunk]:
+            results_to_cache[keys[ichunk][ihist]] = { key: value for key, value in result.items() if key != "kept_values" }
+
+
+def __pop_kept_values(results):
+    """Remove the values kept in memory from the range summaries of all chunks, and return them.
+
+    Returns:
+        list[dict[int, tuple]]: Values and weights of each histogram of each chunk, when kept
+    """
+
+    return [
+        { ihist: summary.pop("kept_values") for ihist, summary in chunk_results.items() if "kept_values" in summary }
+        for chunk_results in results
+    ]
+
+
+def __get_histogram(args, bin_sums, binning):
+
+    n_bins, min_, max_ = binning
 
     # Draw histogram
     histogram = ROOT.TH1D("", "", n_bins, min_, max_)
-    for x in branch: histogram.Fill(x)
+    __set_bin_sums(histogram, bin_sums)
 
     if args.normalize_to_1:
         histogram.Scale(1 / histogram.Integral())
@@ -225,23 +817,37 @@ def main():
     args = __get_arguments()
     __setup_style()
 
-    file_names = args.file.split(",")
     branch_names = args.branch.split(",")
+    number_of_histograms = len(branch_names)
     if args.legend is not None:
         legends = args.legend.split(",")
     else:
         legends = None
 
-    if len(file_names) != len(branch_names):
-        print("ERROR: The number of branches and files must be equal!")
-        sys.exit()
+    # One file argument per histogram, or one file argument for all histograms
+    file_arguments = args.file.split(",")
+    if number_of_histograms == 1 or len(file_arguments) != number_of_histograms:
+        file_arguments = [ args.file for ihist in range(number_of_histograms) ]
+    file_lists = {}
+    for file_argument in file_arguments:
+        if file_argument not in file_lists:
+            file_lists[file_argument] = make_file_list(file_argument, args.shard)
+            if len(file_lists[file_argument]) == 0:
+                print("ERROR: No file found for %s!" % file_argument)
+                sys.exit(1)
 
     if args.filter:
         filters = args.filter.split(",")
     else:
         filters = None
 
-    number_of_histograms = len(file_names)
+    if args.weight:
+        weight_names = args.weight.split(",")
+        if len(weight_names) == 1:
+            weight_names = weight_names * number_of_histograms
+    else:
+        weight_names = None
+
     histograms = [ None for x in range(number_of_histograms) ]
 
     if legends is not None and len(legends) != number_of_histograms:
@@ -258,20 +864,50 @@ def main():
     legend = ROOT.TLegend(0.65, 0.8-(number_of_histograms-2)*0.08, 0.92, 0.9)
     draw_legend = False
 
+    # Histograms are filled chunk by chunk, each chunk reading each branch once for all histograms
+    # The range of all chunks is found first, so that all histograms share the same binning
+    if not args.from_thist:
+        chunks = {}
+        for ihist in range(number_of_histograms):
+            file_names = file_lists[file_arguments[ihist]]
+            branch_name = branch_names[ihist]
+            filter_expression = filters[ihist] if filters is not None else None
+            if filter_expression == "None": filter_expression = None
+            weight_name = weight_names[ihist] if weight_names is not None else None
+            if weight_name == "None": weight_name = None
+            has_filter = args.filter and filter_expression is not None
+            for chunk in __get_chunks(args, file_names, branch_name, has_filter):
+                # slice objects cannot be dictionary keys
+                key = chunk[:3] + (str(chunk[3]),)
+                chunks.setdefault(key, (chunk, []))[1].append((ihist, branch_name, filter_expression, weight_name))
+        chunks = list(chunks.values())
+
+        # The values read for the range are kept to fill the histograms, each chunk is read once
+        if args.min and args.max:
+            binning = __get_binning(args, [])
+            kept_values = None
+        else:
+            range_results = __process_chunks(args, chunks, None)
+            kept_values = __pop_kept_values(range_results)
+            summaries = [ summary for results in range_results for summary in results.values() ]
+            binning = __get_binning(args, summaries)
+
+        bin_sums = [ [] for ihist in range(number_of_histograms) ]
+        for results in __process_chunks(args, chunks, binning, kept_values):
+            for ihist, chunk_bin_sums in results.items():
+                bin_sums[ihist].append(chunk_bin_sums)
+        bin_sums = [ __merge_bin_sums(x, binning[0]) for x in bin_sums ]
+
     for ihist in range(number_of_histograms):
         if args.from_thist:
             pass
 
         else:
-            file_name = file_names[ihist]
-            branch_name = branch_names[ihist]
-            filter_expression = filters[ihist] if filters is not None else None
-            if filter_expression == "None": filter_expression = None
             color = colors[ihist]
             line_style = line_styles[ihist]
             legend_label = legends[ihist] if legends is not None else None
 
-            histogram = __get_histogram_from_array(args, file_name, branch_name, filter_expression, binning=None)
+            histogram = __get_histogram(args, bin_sums[ihist], binning)
             histograms.append(histogram)
             #histogram[ihist].Draw("E1P SAME")
             if legend_label not in (None, "None"):
@@ -1,9 +1,10 @@
 import argparse
-import re
+import fnmatch
 
 import uproot
 
-from helpers.generalUtilities import list_to_str
+from helpers import IOUtilities as ioUtl
+from helpers import sizeUtilities as sizeUtl
 
 
 def __get_arguments():
@@ -28,59 +29,163 @@ def __get_arguments():
         help="No empty lines",
         action="store_true"
         )
+    parser.add_argument(
+        "-m", "--match",
+        help="Only list keys matching a glob pattern, with one pattern per level separated by /, "
+             "e.g. 'Jet*' or 'Events/Jet*'. Keys which do not match are not read.",
+        default=None,
+        )
+    parser.add_argument(
+        "-s", "--sizes",
+        help="Show compressed and uncompressed size of each branch and collection of the TTrees, "
+             "from metadata only. TTrees can be selected with --match.",
+        action="store_true"
+        )
+    parser.add_argument(
+        "-nc", "--no_cache",
+        help="Do not use the on-disk cache of ROOT files metadata",
+        action="store_true"
+        )
+    parser.add_argument(
+        "-rc", "--refresh_cache",
+        help="Read the ROOT file metadata again and update the on-disk cache",
+        action="store_true"
+        )
 
     return parser.parse_args()
 
 
-def get_type(full_type):
-    type_ = str(full_type).split("'")[1].split(".")[-1]
-    type_ = type_.replace("Model_", "")
-    re_search = re.search(r"(.*)_v[0-9]+", type_)
-    if re_search:
-        type_ = re_search.group(1)
-    return type_
+def __matches(name, patterns, level):
+    """Return whether a key name at a given level matches the --match patterns."""
 
+    if level >= len(patterns):
+        return True
+    return fnmatch.fnmatchcase(name, patterns[level])
 
 
-def main(args):
+def __iterate_metadata(node, depth, patterns, level=0):
+    """Yield (level, classname, name, num_entries) for the children of a node of the file metadata."""
 
-    filename = args.file
-    depth = int(args.depth)
+    if level >= depth:
+        return
+
+    for child in node["children"]:
+        if not __matches(child["name"], patterns, level):
+            continue
+        yield level, child["classname"], child["name"], child.get("num_entries")
+        yield from __iterate_metadata(child, depth, patterns, level+1)
+
+
+def __iterate_branches(branches, depth, patterns, level):
+    """Yield (level, classname, name, num_entries) for TBranches, without reading their baskets."""
+
+    if level >= depth:
+        return
+
+    for branch in branches:
+        if not __matches(branch.name, patterns, level):
+            continue
+        yield level, branch.classname, branch.name, None
+        yield from __iterate_branches(branch.branches, depth, patterns, level+1)
 
-    file_ = uproot.open(filename)
+
+def __iterate_directory(directory, depth, patterns, level=0):
+    """Yield (level, classname, name, num_entries) for the keys of a directory.
+
+    Keys are listed from the key table of the directory. An object is only
+    read if its content is listed, i.e. a sub-directory or a TTree above the
+    requested depth, or a top-level TTree whose number of entries is shown.
+    """
+
+    if level >= depth:
+        return
+
+    for name, classname in directory.classnames(recursive=False, cycle=False).items():
+        if not __matches(name, patterns, level):
+            continue
+
+        if classname == "TTree" and (level == 0 or level+1 < depth):
+            tree = directory[name]
+            yield level, classname, name, tree.num_entries
+            yield from __iterate_branches(tree.branches, depth, patterns, level+1)
+        elif classname in ioUtl.directory_classnames and level+1 < depth:
+            yield level, classname, name, None
+            yield from __iterate_directory(directory[name], depth, patterns, level+1)
+        else:
+            yield level, classname, name, None
+
+
+def __print_keys(args, keys):
+    """Print keys as they are listed, so that the first lines appear before the whole file is walked."""
 
     if args.no_empty_line: newline = ""
     else: newline = "\n"
 
-    if depth>0 and hasattr(file_, "keys"):
-        for in1 in file_.keys():
-            f1 = file_[in1]
-            type_ = get_type(type(f1))
-            element = list_to_str(in1.split(";")[:-1])
-            if type_ == "TTree":
-                k0 = list(f1.keys())[0]
-                nevts = f1[k0].num_entries
-                if element == "Events":
-                    name = "events" if nevts > 1 else "event"
-                else:
-                    name = "entries" if nevts > 1 else "entry"
-                nevtsStr = " (%d %s)" %(nevts, name)
-            else:
-                nevtsStr = ""
-            if args.no_bold:
-                print(newline + type_ + "\t" + element + nevtsStr )
+    for level, type_, element, nevts in keys:
+        if level > 0:
+            print(4*level*" " + type_ + "\t" + element, flush=True)
+            continue
+
+        if type_ == "TTree":
+            if element == "Events":
+                name = "events" if nevts > 1 else "event"
             else:
-                print("\033[1m" + newline + type_ + "\t" + element + nevtsStr + "\033[0m")
-            if depth>1:
-                if hasattr(f1, "keys"):
-                    for in2 in f1.keys():
-                        type_ = get_type(type(f1[in2]))
-                        print(4*" " + type_ + "\t" + in2)
-                        if depth>2:
-                            f2 = f1[in2]
-                            if hasattr(f2, "keys"):
-                                for in3 in f2.keys():
-                                    print(8*" " + in3)
+                name = "entries" if nevts > 1 else "entry"
+            nevtsStr = " (%d %s)" %(nevts, name)
+        else:
+            nevtsStr = ""
+        if args.no_bold:
+            print(newline + type_ + "\t" + element + nevtsStr, flush=True)
+        else:
+            print("\033[1m" + newline + type_ + "\t" + element + nevtsStr + "\033[0m", flush=True)
+
+
+def __print_sizes(args, metadata, patterns):
+    """Print the branch sizes of each TTree matching the --match patterns."""
+
+    def print_trees(node, path, level):
+        for child in node["children"]:
+            if not __matches(child["name"], patterns, level):
+                continue
+            if child["classname"] == "TTree":
+                if args.no_bold:
+                    print("\nTTree\t" + path + child["name"], flush=True)
+                else:
+                    print("\033[1m\nTTree\t" + path + child["name"] + "\033[0m", flush=True)
+                sizeUtl.print_sizes(child)
+            elif child["classname"] in ioUtl.directory_classnames:
+                print_trees(child, path + child["name"] + "/", level+1)
+
+    print_trees(metadata, "", 0)
+
+
+def main(args):
+
+    filename = args.file
+    depth = int(args.depth)
+    patterns = args.match.split("/") if args.match else []
+
+    if args.sizes:
+        metadata = ioUtl.get_root_file_metadata(filename, not args.no_cache, args.refresh_cache)
+        __print_sizes(args, metadata, patterns)
+        return
+
+    if depth <= 0:
+        return
+
+    # Take the listing from cached metadata if available, else from the key tables of the file
+    if args.no_cache:
+        metadata = None
+    elif args.refresh_cache:
+        metadata = ioUtl.get_root_file_metadata(filename, use_cache=True, refresh_cache=True)
+    else:
+        metadata = ioUtl.get_cached_root_file_metadata(filename)
+
+    if metadata is None:
+        with uproot.open(filename) as file_:
+            __print_keys(args, __iterate_directory(file_, depth, patterns))
+    else:
+        __print_keys(args, __iterate_metadata(metadata, depth, patterns))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,37 @@
-import uproot
 import argparse
 
+from helpers import IOUtilities as ioUtl
+from helpers import sizeUtilities as sizeUtl
+
+
+def show(node, name_width=45, typename_width=24, interpretation_width=30):
+    """Print the branches of a TTree from its metadata, in the format of uproot's TTree.show."""
+
+    formatter = "{{0:{0}.{0}}} | {{1:{1}.{1}}} | {{2:{2}.{2}}}".format(
+        name_width,
+        typename_width,
+        interpretation_width,
+    )
+
+    print(formatter.format("name", "typename", "interpretation"))
+    print("-"*name_width + "-+-" + "-"*typename_width + "-+-" + "-"*interpretation_width)
+
+    def print_branches(branches, prefix):
+        for branch in branches:
+            name = prefix + branch["name"]
+            typename = branch["typename"]
+            interpretation = branch["interpretation"]
+            if len(name) > name_width:
+                name = name[:name_width-3] + "..."
+            if len(typename) > typename_width:
+                typename = typename[:typename_width-3] + "..."
+            if len(interpretation) > interpretation_width:
+                interpretation = interpretation[:interpretation_width-3] + "..."
+            print(formatter.format(name, typename, interpretation).rstrip(" "))
+            print_branches(branch["children"], prefix + branch["name"] + "/")
+
+    print_branches(node["children"], "")
+
 
 if (__name__ == "__main__"):
 
@@ -16,8 +47,26 @@ if (__name__ == "__main__"):
         help="Tree to show",
         required=True,
     )
+    parser.add_argument(
+        "-s", "--sizes",
+        help="Show compressed and uncompressed size of each branch and collection, from metadata only",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-nc", "--no_cache",
+        help="Do not use the on-disk cache of ROOT files metadata",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-rc", "--refresh_cache",
+        help="Read the ROOT file metadata again and update the on-disk cache",
+        action="store_true",
+    )
 
     args = parser.parse_args()
-    
-    file = uproot.open(args.file + ":" + args.tree)
-    file.show(name_width=45)
+
+    metadata = ioUtl.get_root_file_metadata(args.file, not args.no_cache, args.refresh_cache)
+    if args.sizes:
+        sizeUtl.print_sizes(ioUtl.find_metadata_node(metadata, args.tree), name_width=45)
+    else:
+        show(ioUtl.find_metadata_node(metadata, args.tree), name_width=45)